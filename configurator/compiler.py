@@ -1,8 +1,31 @@
+import hashlib
 import logging
-from dataclasses import fields
-from typing import Callable, List, Type
+import pickle
+from dataclasses import dataclass, fields, is_dataclass
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+)
 
+from configurator.memory import MemoryBudgetExceeded, MemoryTracker, phase
+from configurator.operators import (
+    MISSING,
+    MergeOperator,
+    PendingMerge,
+    resolve_pending,
+)
+from configurator.patch import PatchManifest, writes_patches
 from configurator.schemas import Schema
+from configurator.validation import ValidationError, validate_concurrently
 
 
 LOGGER = logging.getLogger(__file__)
@@ -31,13 +54,24 @@ class Template(object):
         return True
 
     def merge_from(self: "Template", other: "Template") -> None:
+        """Merge `other` onto this template, merge operators are applied right away.
+
+        Only `FlatTemplate`, which configs are resolved with, chains operators.
+        """
         for field in other.fields:
             field_value = getattr(other, field)
+            if isinstance(field_value, MergeOperator):
+                current = getattr(self, field) if field in self.fields else MISSING
+                if field not in self.fields:
+                    self.fields.append(field)
+                setattr(self, field, field_value(resolve_pending(current)))
+                continue
             if field not in self.fields:
                 self.fields.append(field)
                 setattr(self, field, field_value)
             if callable(field_value):
-                setattr(self, field, field_value(getattr(self, field)))
+                current = resolve_pending(getattr(self, field))
+                setattr(self, field, field_value(current))
             elif isinstance(field_value, Template) and isinstance(
                 getattr(self, field), Template
             ):
@@ -47,13 +81,174 @@ class Template(object):
         LOGGER.debug(f"Merge templates, now have keys: {self.fields}")
 
 
+NESTED = "__CONFIGURATOR_NESTED_TEMPLATE"
+
+
+class FlatTemplate(object):
+    """Template compiled down to a mapping of dotted paths to values.
+
+    Overriding a deep key such as `ec2_settings.subnet_id` is a dictionary update
+    instead of a walk through nested templates. Nested templates are kept in
+    `values` with the `NESTED` marker so that empty ones survive a round trip and
+    the order of the fields is preserved. Parents always come before children.
+    """
+
+    def __init__(self: "FlatTemplate", values: Dict[str, Any] = None) -> None:
+        self.values: Dict[str, Any] = {}
+        for path, value in (values or {}).items():
+            self._assign(path, value)
+
+    @classmethod
+    def from_template(cls, template: Template) -> "FlatTemplate":
+        flat = cls()
+        flat._load_template("", template)
+        return flat
+
+    def __eq__(self: "FlatTemplate", other: object) -> bool:
+        return isinstance(other, FlatTemplate) and self.values == other.values
+
+    def _make_parents(self: "FlatTemplate", path: str) -> None:
+        parent = path.rpartition(".")[0]
+        if parent and self.values.get(parent, None) is not NESTED:
+            self._make_parents(parent)
+            self.values[parent] = NESTED
+
+    def _drop_children(self: "FlatTemplate", path: str) -> None:
+        prefix = path + "."
+        for key in [key for key in self.values if key.startswith(prefix)]:
+            del self.values[key]
+
+    def _make_node(self: "FlatTemplate", path: str) -> None:
+        if self.values.get(path, None) is not NESTED:
+            self._make_parents(path)
+            self.values[path] = NESTED
+
+    def _load_template(self: "FlatTemplate", prefix: str, template: Template) -> None:
+        for field in template.fields:
+            self._assign(prefix + field, getattr(template, field))
+
+    def _assign(self: "FlatTemplate", path: str, value: Any) -> None:
+        """Replace whatever is at `path` with `value`, callables are kept as is."""
+        if self.values.get(path, None) is NESTED:
+            self._drop_children(path)
+        if isinstance(value, Template):
+            self._make_node(path)
+            self._load_template(path + ".", value)
+        elif isinstance(value, FlatTemplate):
+            self._make_node(path)
+            for key, nested_value in value.values.items():
+                self.values[f"{path}.{key}"] = nested_value
+        else:
+            self._make_parents(path)
+            self.values[path] = value
+
+    def _subtree(self: "FlatTemplate", path: str) -> "FlatTemplate":
+        prefix = path + "."
+        subtree = FlatTemplate()
+        subtree.values = {
+            key[len(prefix) :]: value
+            for key, value in self.values.items()
+            if key.startswith(prefix)
+        }
+        return subtree
+
+    def _merge_value(self: "FlatTemplate", path: str, value: Any) -> None:
+        if isinstance(value, Template):
+            self._make_node(path)
+            self._merge_template(path + ".", value)
+        elif isinstance(value, FlatTemplate):
+            self._make_node(path)
+            self._merge_flat(path + ".", value)
+        elif isinstance(value, MergeOperator):
+            current = self.values.get(path, MISSING)
+            if current is NESTED:
+                current = self._subtree(path).to_template()
+            self._assign(path, PendingMerge(current, value))
+        elif callable(value):
+            current = resolve_pending(self.values.get(path, value))
+            if current is NESTED:
+                current = self._subtree(path).to_template()
+            self._assign(path, value(current))
+        else:
+            self._assign(path, value)
+
+    def _merge_template(self: "FlatTemplate", prefix: str, other: Template) -> None:
+        for field in other.fields:
+            self._merge_value(prefix + field, getattr(other, field))
+
+    def _merge_flat(self: "FlatTemplate", prefix: str, other: "FlatTemplate") -> None:
+        for path, value in other.values.items():
+            if value is NESTED:
+                self._make_node(prefix + path)
+            else:
+                self._merge_value(prefix + path, value)
+
+    def merge_from(
+        self: "FlatTemplate", other: Union[Template, "FlatTemplate"]
+    ) -> None:
+        """Same semantic as `Template.merge_from()` but without recursion."""
+        if isinstance(other, FlatTemplate):
+            self._merge_flat("", other)
+        else:
+            self._merge_template("", other)
+
+    def children(self: "FlatTemplate") -> Dict[str, List[str]]:
+        """Map the path of every template (`""` for the root) to its field names."""
+        children: Dict[str, List[str]] = {"": []}
+        for path, value in self.values.items():
+            parent, _, name = path.rpartition(".")
+            children[parent].append(name)
+            if value is NESTED:
+                children[path] = []
+        return children
+
+    def to_template(self: "FlatTemplate") -> Template:
+        root = Template()
+        templates = {"": root}
+        for path, value in self.values.items():
+            parent, _, name = path.rpartition(".")
+            if value is NESTED:
+                value = templates[path] = Template()
+            templates[parent].fields.append(name)
+            setattr(templates[parent], name, resolve_pending(value))
+        return root
+
+
 UNSET = "__CONFIGURATOR_UNSET_FIELD"
 
 
+def _instanciate_schema_from_flat(
+    schema: Type[Schema],
+    values: Dict[str, Any],
+    children: Dict[str, List[str]],
+    prefix: str,
+) -> Schema:
+    spec = {}
+    expected_fields = {f.name for f in fields(schema)}
+    differences = expected_fields.symmetric_difference(children[prefix])
+    if differences:
+        raise TypeError(
+            f"Attributes mismatch between the Schema and Template: {differences}"
+        )
+    for field in fields(schema):
+        path = f"{prefix}.{field.name}" if prefix else field.name
+        value = values[path]
+        if value is NESTED:
+            value = _instanciate_schema_from_flat(field.type, values, children, path)
+        value = resolve_pending(value)
+        if value != UNSET:
+            spec[field.name] = value
+    return schema(**spec)  # type: ignore
+
+
 def instanciate_schema_from_template(
-    schema: Type[Schema], template: Template
+    schema: Type[Schema], template: Union[Template, FlatTemplate]
 ) -> Schema:
     """Instanciate a Schema from a list of Templates."""
+    if isinstance(template, FlatTemplate):
+        return _instanciate_schema_from_flat(
+            schema, template.values, template.children(), ""
+        )
     spec = {}
     expected_fields = {f.name for f in fields(schema)}
     differences = expected_fields.symmetric_difference(template.fields)
@@ -67,7 +262,7 @@ def instanciate_schema_from_template(
             if isinstance(template_value, Template):
                 value = instanciate_schema_from_template(field.type, template_value)
             else:
-                value = template_value
+                value = resolve_pending(template_value)
             spec[field.name] = value
         if spec[field.name] == UNSET:
             del spec[field.name]
@@ -78,6 +273,7 @@ class Config(object):
     __slots__ = [
         "config_modifiers",
         "config_validators",
+        "name",
         "output",
         "schema",
         "templates",
@@ -91,12 +287,14 @@ class Config(object):
         templates: List[Template] = None,
         config_modifiers: List[Callable[[Schema], None]] = None,
         config_validators: List[Callable[[Schema], None]] = None,
+        name: Optional[str] = None,
     ):
         self.schema: Type[Schema] = schema
         self.writer = writer
         self.templates = templates or []
         self.config_modifiers = config_modifiers or []
         self.config_validators = config_validators or []
+        self.name = name
 
     def resolve(self: "Config") -> None:
         """Resolve the configuration.
@@ -105,7 +303,7 @@ class Config(object):
         modifiers in order.
         """
         # Create a flat template by merging all the templates
-        flat_template = Template()
+        flat_template = FlatTemplate()
         for template in self.templates:
             flat_template.merge_from(template)
         # Create new object from the flat template
@@ -127,14 +325,181 @@ class Config(object):
         self.writer(self.output)
 
 
+def config_identity(config: Config, index: int) -> str:
+    """Identify a config within its set, falling back on its position."""
+    name = getattr(config, "name", None)
+    return name if isinstance(name, str) else str(index)
+
+
+def shard_of(identity: str, num_shards: int) -> int:
+    """Stable shard assignment, identical across processes and machines."""
+    digest = hashlib.sha1(identity.encode("utf-8")).hexdigest()
+    return int(digest, 16) % num_shards
+
+
+@lru_cache(maxsize=None)
+def _schema_fields(schema: Type[Schema]) -> Dict[str, Optional[type]]:
+    """Field names of a schema, mapped to their type when it is a nested schema."""
+    return {
+        field.name: field.type if is_dataclass(field.type) else None
+        for field in fields(schema)
+    }
+
+
+@dataclass
+class ConformanceIssue(object):
+    """A key of a template layer that doesn't match the schema.
+
+    `kind` is one of "unknown" (the schema has no such field), "nested" (a nested
+    template for a field that is not a schema) or "missing" (no layer sets the
+    field). `layer` is the index of the template, None for missing keys.
+    """
+
+    config: str
+    layer: Optional[int]
+    path: str
+    kind: str
+
+    def __str__(self: "ConformanceIssue") -> str:
+        layer = "" if self.layer is None else f" in template {self.layer}"
+        return f"{self.config}: {self.kind} key '{self.path}'{layer}"
+
+
+class TemplateConformanceError(TypeError):
+    """Raised with every conformance issue found in a configset."""
+
+    def __init__(
+        self: "TemplateConformanceError", issues: List[ConformanceIssue]
+    ) -> None:
+        lines = [f"{len(issues)} template keys don't match their schema:"]
+        lines += [f"  {issue}" for issue in issues]
+        super().__init__("\n".join(lines))
+        self.issues = issues
+
+
+def _check_layer(
+    schema: Type[Schema],
+    template: Template,
+    skeleton: Dict[str, Any],
+    prefix: str,
+    report: Callable[[str, str], None],
+) -> None:
+    """Check the keys of a template and merge its shape into `skeleton`.
+
+    The skeleton maps each key merged so far to None for values, or to the
+    skeleton of the nested template.
+    """
+    expected = _schema_fields(schema)
+    for name in template.fields:
+        path = prefix + name
+        if name not in expected:
+            report(path, "unknown")
+            continue
+        value = getattr(template, name)
+        if isinstance(value, Template):
+            nested = expected[name]
+            if nested is None:
+                report(path, "nested")
+                skeleton[name] = None
+                continue
+            if not isinstance(skeleton.get(name), dict):
+                skeleton[name] = {}
+            _check_layer(nested, value, skeleton[name], path + ".", report)
+        elif not (callable(value) and isinstance(skeleton.get(name), dict)):
+            # Callables are assumed to keep the shape of what they are merged on.
+            skeleton[name] = None
+
+
+def _check_missing(
+    schema: Type[Schema],
+    skeleton: Dict[str, Any],
+    prefix: str,
+    report: Callable[[str, str], None],
+) -> None:
+    for name, nested in _schema_fields(schema).items():
+        if name not in skeleton:
+            report(prefix + name, "missing")
+        elif nested is not None and isinstance(skeleton[name], dict):
+            _check_missing(nested, skeleton[name], prefix + name + ".", report)
+
+
+def find_conformance_issues(configs: Iterable[Config]) -> List[ConformanceIssue]:
+    """Check the keys of every template layer against the schema of its config.
+
+    Only the keys are looked at, no value is merged, so this is a quick sweep
+    reporting what `instanciate_schema_from_template` would fail on.
+    """
+    issues: List[ConformanceIssue] = []
+    for index, config in enumerate(configs):
+        identity = config_identity(config, index)
+        skeleton: Dict[str, Any] = {}
+        for layer, template in enumerate(config.templates):
+            if isinstance(template, FlatTemplate):
+                template = template.to_template()
+            _check_layer(
+                config.schema,
+                template,
+                skeleton,
+                "",
+                lambda path, kind: issues.append(
+                    ConformanceIssue(identity, layer, path, kind)
+                ),
+            )
+        _check_missing(
+            config.schema,
+            skeleton,
+            "",
+            lambda path, kind: issues.append(
+                ConformanceIssue(identity, None, path, kind)
+            ),
+        )
+    return issues
+
+
+@dataclass
+class ShardManifest(object):
+    """What a shard of a ConfigSet produced, to be merged with the other shards."""
+
+    shard: int
+    num_shards: int
+    identities: List[str]
+    indexes: List[int]
+    outputs: List[Schema]
+
+    def dump(self: "ShardManifest", path: str) -> None:
+        with open(path, "wb") as fd:
+            pickle.dump(self, fd)
+
+    @staticmethod
+    def load(path: str) -> "ShardManifest":
+        with open(path, "rb") as fd:
+            return pickle.load(fd)
+
+
+@dataclass
+class _Options(object):
+    """Settings of a single materialization."""
+
+    validation_workers: Optional[int]
+    max_failures: Optional[int]
+    memory: Optional[MemoryTracker]
+    patches: Optional[PatchManifest]
+
+
 class ConfigSet(object):
-    """A group of configurations that are tied together."""
+    """A group of configurations that are tied together.
+
+    The configs can be given as a list, or as an iterable or a factory returning
+    one. The latter are consumed lazily during the materialization so that the
+    configs are only built when they are needed, and the templates of the configs
+    that have been resolved are released.
+    """
 
     __slots__ = ["configs", "configset_modifiers", "configset_validators"]
 
     def __init__(
         self: "ConfigSet",
-        configs: List[Config],
+        configs: Union[Iterable[Config], Callable[[], Iterable[Config]]],
         configset_modifiers: List[Callable[[List[Schema]], None]] = None,
         configset_validators: List[Callable[[List[Schema]], None]] = None,
     ):
@@ -142,24 +507,226 @@ class ConfigSet(object):
         self.configset_modifiers = configset_modifiers or []
         self.configset_validators = configset_validators or []
 
-    def materialize(self: "ConfigSet") -> None:
+    def iter_configs(self: "ConfigSet") -> Iterator[Config]:
+        """Iterate over the configs, calling the factory if there is one."""
+        if callable(self.configs):
+            return iter(self.configs())
+        return iter(self.configs)
+
+    def check_templates(self: "ConfigSet") -> None:
+        """Check every template layer against its schema before merging anything.
+
+        Raises a `TemplateConformanceError` listing all the issues at once. This
+        iterates over the configs, so lazy configsets need a factory.
+        """
+        if not callable(self.configs) and not isinstance(self.configs, Sequence):
+            raise ValueError("Can't check the templates of a one-shot iterator.")
+        issues = find_conformance_issues(self.iter_configs())
+        if issues:
+            raise TemplateConformanceError(issues)
+
+    def _write(
+        self: "ConfigSet", config: Config, identity: str, options: _Options
+    ) -> None:
+        if options.memory is not None:
+            options.memory.record_size(identity, config.output)
+        if options.patches is not None:
+            patch = options.patches.update(identity, config.output)
+            if writes_patches(config.writer):
+                if patch:
+                    config.writer(patch)
+                return
+        config.write()
+
+    def _resolve(
+        self: "ConfigSet",
+        configs: Iterable[Config],
+        options: _Options,
+        can_stream: bool = False,
+    ) -> List[Config]:
+        """Resolve the configs as they come and only keep what is still needed.
+
+        Without configset modifiers nothing can change a config after it has
+        been resolved, so it is validated right away unless validation is
+        concurrent. Going over the memory budget either fails or, when
+        `can_stream`, writes the configs as they come and releases their output.
+        """
+        lazy = not isinstance(self.configs, Sequence)
+        validate = options.validation_workers is None and not self.configset_modifiers
+        can_stream = can_stream and validate and not self.configset_validators
+        memory = options.memory
+        streaming = False
+        resolved = []
+        for index, config in enumerate(configs):
+            config.resolve()
+            if validate:
+                config.validate()
+            if lazy:
+                config.templates = []
+            if streaming:
+                self._write(config, config_identity(config, index), options)
+                del config.output
+                continue
+            resolved.append(config)
+            if memory is not None and memory.over_budget():
+                if not (can_stream and memory.stream_on_budget):
+                    raise MemoryBudgetExceeded(memory.report)
+                LOGGER.warning("Over the memory budget, writing configs as they come.")
+                streaming = True
+                for position, written in enumerate(resolved):
+                    self._write(written, config_identity(written, position), options)
+                    del written.output
+                resolved = []
+        return resolved
+
+    def _validate(
+        self: "ConfigSet",
+        configs: List[Config],
+        identities: List[str],
+        options: _Options,
+    ) -> None:
+        if options.validation_workers is None:
+            if self.configset_modifiers:
+                for config in configs:
+                    config.validate()
+            return
+        report = validate_concurrently(
+            [
+                (identity, config.output, config.config_validators)
+                for identity, config in zip(identities, configs)
+            ],
+            max_workers=options.validation_workers,
+            max_failures=options.max_failures,
+        )
+        if report.failures:
+            raise ValidationError(report)
+
+    def materialize(
+        self: "ConfigSet",
+        shard: int = None,
+        num_shards: int = None,
+        validation_workers: int = None,
+        max_failures: int = None,
+        memory: MemoryTracker = None,
+        patches: PatchManifest = None,
+        check_templates: bool = False,
+    ) -> Optional[ShardManifest]:
         """Generate all configs in this set and write them out.
 
         This will first resolve all the configurations, then apply the configset
         modifiers. We will then validate each config individually before validating
-        the configset. Finally the configs will be written out.
+        the configset. Finally the configs will be written out. In a regular run
+        nothing is written if any validation fails.
+
+        When `num_shards` is given only the configs hashed to `shard` are
+        generated. The configset validators are then deferred to `merge_shards()`
+        and the returned manifest has to be handed over to it. Each shard writes
+        its configs before that, so a failing `merge_shards()` leaves the files
+        of every shard already written.
+
+        When `validation_workers` is given the config validators all run
+        concurrently and a `ValidationError` reporting every failure is raised,
+        instead of the first exception. `max_failures` stops the validation once
+        that many failures have been found.
+
+        When a `memory` tracker is given it accounts for the memory used by each
+        phase and enforces its budget, see `MemoryTracker`. If it switches to
+        streaming, each config is written once validated, before the next ones
+        are, so a later failure leaves the earlier configs written.
+
+        When a `patches` manifest is given each config is diffed against its
+        previous build. Writers marked with `patch_writer` then only get the
+        patch, and are not called at all if nothing changed.
+
+        With `check_templates` the keys of all the templates are checked against
+        their schema first, see `check_templates()`.
         """
+        if check_templates:
+            self.check_templates()
+        options = _Options(validation_workers, max_failures, memory, patches)
+        if memory is None:
+            return self._materialize(shard, num_shards, options)
+        with memory.tracking():
+            return self._materialize(shard, num_shards, options)
+
+    def _materialize(
+        self: "ConfigSet",
+        shard: Optional[int],
+        num_shards: Optional[int],
+        options: _Options,
+    ) -> Optional[ShardManifest]:
+        if num_shards is not None:
+            return self._materialize_shard(shard, num_shards, options)
         LOGGER.info("Starting materialization.")
-        for config in self.configs:
-            config.resolve()
-        for modifier in self.configset_modifiers:
-            modifier([config.output for config in self.configs])
-        for config in self.configs:
-            config.validate()
+        memory = options.memory
+        with phase(memory, "resolve"):
+            configs = self._resolve(self.iter_configs(), options, can_stream=True)
+        with phase(memory, "configset_modifiers"):
+            for modifier in self.configset_modifiers:
+                modifier([config.output for config in configs])
+        identities = [config_identity(config, i) for i, config in enumerate(configs)]
+        with phase(memory, "validate"):
+            self._validate(configs, identities, options)
+        with phase(memory, "configset_validators"):
+            for validator in self.configset_validators:
+                validator([config.output for config in configs])
+        with phase(memory, "write"):
+            for identity, config in zip(identities, configs):
+                self._write(config, identity, options)
+        return None
+
+    def _materialize_shard(
+        self: "ConfigSet",
+        shard: Optional[int],
+        num_shards: int,
+        options: _Options,
+    ) -> ShardManifest:
+        if shard is None or not 0 <= shard < num_shards:
+            raise ValueError(f"Invalid shard {shard} for {num_shards} shards.")
+        if self.configset_modifiers:
+            raise ValueError("Configset modifiers need all configs, can't shard.")
+        LOGGER.info(f"Starting materialization of shard {shard}/{num_shards}.")
+        manifest = ShardManifest(shard, num_shards, [], [], [])
+
+        def selected() -> Iterator[Config]:
+            for index, config in enumerate(self.iter_configs()):
+                identity = config_identity(config, index)
+                if shard_of(identity, num_shards) == shard:
+                    manifest.identities.append(identity)
+                    manifest.indexes.append(index)
+                    yield config
+
+        memory = options.memory
+        with phase(memory, "resolve"):
+            configs = self._resolve(selected(), options)
+        with phase(memory, "validate"):
+            self._validate(configs, manifest.identities, options)
+        with phase(memory, "write"):
+            for identity, config in zip(manifest.identities, configs):
+                self._write(config, identity, options)
+                manifest.outputs.append(config.output)
+        return manifest
+
+    def merge_shards(self: "ConfigSet", manifests: List[ShardManifest]) -> List[Schema]:
+        """Combine the manifests of all shards and validate the whole configset.
+
+        Returns the outputs of all the configs in their original order.
+        """
+        num_shards = {manifest.num_shards for manifest in manifests}
+        if len(num_shards) != 1:
+            raise ValueError("Manifests disagree on the number of shards.")
+        shards = sorted(manifest.shard for manifest in manifests)
+        if shards != list(range(num_shards.pop())):
+            raise ValueError(f"Expected exactly one manifest per shard, got {shards}.")
+        outputs = sorted(
+            (index, output)
+            for manifest in manifests
+            for index, output in zip(manifest.indexes, manifest.outputs)
+        )
+        merged = [output for _, output in outputs]
         for validator in self.configset_validators:
-            validator([config.output for config in self.configs])
-        for config in self.configs:
-            config.write()
+            validator(merged)
+        return merged
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import tempfile
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from configurator.compiler import Template
+from configurator.schemas import Schema
+
+
+LOGGER = logging.getLogger(__file__)
+
+# Part of the cache key, bump it whenever a parser changes what it returns.
+CACHE_VERSION = 2
+
+
+def _read(path: str) -> bytes:
+    # Parsers need the whole content, one sized read avoids growing a buffer.
+    with open(path, "rb") as fd:
+        return fd.read(os.fstat(fd.fileno()).st_size)
+
+
+def _parse_json(content: bytes) -> Any:
+    return json.loads(content)
+
+
+def _parse_yaml(content: bytes) -> Any:
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("PyYAML is required to load yaml templates.")
+    return yaml.safe_load(content)
+
+
+_PROPERTIES_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "f": "\f"}
+_PROPERTIES_ESCAPE = re.compile(r"\\(?:u([0-9a-fA-F]{4})|(.))")
+
+
+def _unescape_properties(value: str) -> str:
+    def replace(match: "re.Match") -> str:
+        if match.group(1):
+            return chr(int(match.group(1), 16))
+        return _PROPERTIES_ESCAPES.get(match.group(2), match.group(2))
+
+    return _PROPERTIES_ESCAPE.sub(replace, value)
+
+
+def _split_property(line: str) -> Tuple[str, str]:
+    """Split a logical line on the first unescaped `=`, `:` or whitespace."""
+    position = 0
+    while position < len(line) and line[position] not in "=: \t\f":
+        position += 2 if line[position] == "\\" else 1
+    key = line[:position]
+    value = line[position:].lstrip(" \t\f")
+    if value[:1] in ("=", ":"):
+        value = value[1:]
+    return _unescape_properties(key), _unescape_properties(value.strip())
+
+
+def _parse_properties(content: bytes) -> Dict[str, Any]:
+    """Parse a properties file, dotted keys are nested like in a FlatTemplate.
+
+    A key can't hold both a value and nested keys, `a=1` with `a.b=2` is an error.
+    """
+    data: Dict[str, Any] = {}
+    lines = content.decode("utf-8").splitlines()
+    index = 0
+    while index < len(lines):
+        line = lines[index].lstrip()
+        index += 1
+        if not line or line[0] in "#!":
+            continue
+        # A line ending with an odd number of backslashes continues on the next.
+        while (len(line) - len(line.rstrip("\\"))) % 2 and index < len(lines):
+            line = line[:-1] + lines[index].lstrip()
+            index += 1
+        key, value = _split_property(line)
+        node = data
+        *parents, name = key.split(".")
+        for depth, parent in enumerate(parents):
+            node = node.setdefault(parent, {})
+            if not isinstance(node, dict):
+                conflict = ".".join(parents[: depth + 1])
+                raise ValueError(f"Property '{key}' is nested in value '{conflict}'.")
+        if isinstance(node.get(name), dict):
+            raise ValueError(f"Property '{key}' has nested properties.")
+        node[name] = value
+    return data
+
+
+PARSERS: Dict[str, Callable[[bytes], Any]] = {
+    ".json": _parse_json,
+    ".properties": _parse_properties,
+    ".yaml": _parse_yaml,
+    ".yml": _parse_yaml,
+}
+
+
+def _cache_file(cache_dir: str, path: str) -> str:
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.pickle")
+
+
+def _save_cache(cache_file: str, key: Any, data: Any) -> None:
+    """Write a cache file atomically, shards may share the same cache_dir."""
+    directory = os.path.dirname(cache_file)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as temporary_fd:
+            pickle.dump((key, data), temporary_fd, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cache_file)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def load_data(path: str, cache_dir: str = None) -> Any:
+    """Parse a template file, reusing the cached result if it did not change.
+
+    The cache holds one pickle per file, invalidated by the file's mtime and size.
+    """
+    path = os.path.abspath(path)
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in PARSERS:
+        raise ValueError(f"Don't know how to load templates from '{path}'.")
+    stat = os.stat(path)
+    key = (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    cache_file = _cache_file(cache_dir, path) if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as fd:
+                cached_key, data = pickle.load(fd)
+        except Exception:
+            LOGGER.warning(f"Ignoring the corrupted cache of '{path}'.")
+            cached_key = None
+        if cached_key == key:
+            LOGGER.debug(f"Loaded '{path}' from the cache.")
+            return data
+    data = PARSERS[extension](_read(path))
+    if cache_file:
+        _save_cache(cache_file, key, data)
+    return data
+
+
+def template_from_data(data: Dict[str, Any], schema: Type[Schema] = None) -> Template:
+    """Build a Template tree out of nested dictionaries.
+
+    Without a schema every dictionary becomes a nested Template. With one, only
+    the dictionaries of fields typed as a nested schema do, the others are kept
+    as values.
+    """
+    if not isinstance(data, dict):
+        raise TypeError(f"Templates are built from a mapping, got {type(data)}.")
+    types: Dict[str, Optional[type]] = {}
+    if schema is not None:
+        types = {field.name: field.type for field in fields(schema)}
+    spec = {}
+    for key, value in data.items():
+        nested = types.get(key)
+        if isinstance(value, dict) and (schema is None or is_dataclass(nested)):
+            value = template_from_data(value, nested)  # type: ignore
+        spec[key] = value
+    return Template(**spec)
+
+
+def load_template(
+    path: str, schema: Type[Schema] = None, cache_dir: str = None
+) -> Template:
+    """Load a Template from a json, yaml or properties file.
+
+    In [1]: hive_cluster_config = load_template(
+       ...:     "templates/hive.yaml", ClusterConfigSchema, cache_dir=".cache"
+       ...: )
+    """
+    return template_from_data(load_data(path, cache_dir), schema)
@@ -0,0 +1,267 @@
+import atexit
+import copy
+import functools
+import hashlib
+import logging
+import marshal
+import os
+import pickle
+import tempfile
+from dataclasses import fields, is_dataclass
+from types import CodeType, FunctionType, ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from configurator.schemas import Schema
+
+
+LOGGER = logging.getLogger(__file__)
+
+
+def _canonical(value: Any) -> Any:
+    """Structure describing a value independently of its identity or ordering."""
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return (type(value).__name__, value)
+    if is_dataclass(value):
+        return (
+            f"{type(value).__module__}.{type(value).__qualname__}",
+            tuple((f.name, _canonical(getattr(value, f.name))) for f in fields(value)),
+        )
+    if isinstance(value, dict):
+        items = [(_canonical(key), _canonical(item)) for key, item in value.items()]
+        return ("dict", tuple(sorted(items, key=repr)))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(_canonical(item) for item in value))
+    if isinstance(value, (set, frozenset)):
+        return ("set", tuple(sorted((_canonical(item) for item in value), key=repr)))
+    raise TypeError(f"Can't fingerprint values of type {type(value)}.")
+
+
+def fingerprint(value: Any) -> str:
+    """Structural hash of a value, stable across processes."""
+    return hashlib.sha256(repr(_canonical(value)).encode("utf-8")).hexdigest()
+
+
+def _get_path(config: Schema, path: Optional[str]) -> Any:
+    value = config
+    for name in path.split(".") if path else []:
+        value = getattr(value, name)
+    return value
+
+
+def _code_names(code: CodeType) -> Iterator[str]:
+    yield from code.co_names
+    for constant in code.co_consts:
+        if isinstance(constant, CodeType):
+            yield from _code_names(constant)
+
+
+def _state(value: Any, seen: Set[int]) -> Any:
+    """Describe a value a hook depends on, falling back to its repr."""
+    if isinstance(value, FunctionType):
+        return _function_state(value, seen)
+    if isinstance(value, (ModuleType, type)):
+        return (type(value).__name__, getattr(value, "__qualname__", value.__name__))
+    try:
+        return _canonical(value)
+    except (TypeError, RecursionError):
+        # Default reprs hold the object's address so such caches never match.
+        return ("repr", repr(value))
+
+
+def _function_state(func: FunctionType, seen: Set[int]) -> Any:
+    """Code, defaults, closure and referenced globals of a function."""
+    if id(func) in seen:
+        return ("recursive", func.__qualname__)
+    seen.add(id(func))
+    cells = []
+    for cell in func.__closure__ or ():
+        try:
+            cells.append(_state(cell.cell_contents, seen))
+        except ValueError:
+            cells.append(("empty",))
+    names = sorted(set(_code_names(func.__code__)) & set(func.__globals__))
+    return (
+        hashlib.sha256(marshal.dumps(func.__code__)).hexdigest(),
+        _state(func.__defaults__, seen),
+        _state(func.__kwdefaults__, seen),
+        tuple(cells),
+        tuple((name, _state(func.__globals__[name], seen)) for name in names),
+    )
+
+
+def _read_entries(cache_path: str) -> Dict[str, Tuple[str, bytes]]:
+    with open(cache_path, "rb") as fd:
+        entries = pickle.load(fd)
+    if not isinstance(entries, dict):
+        raise TypeError(f"Expected a dict of hook caches, got {type(entries)}.")
+    return entries
+
+
+class _PureHook(object):
+    """Cache the outcome of a hook keyed by the fingerprint of one subtree.
+
+    Values that can't be fingerprinted are not cached, the hook then simply
+    runs. When a `cache_path` is given the cache is loaded from it and saved back
+    when the process exits. It is discarded if the hook's code, defaults, closure,
+    referenced globals or `version` changed. Helpers are followed when they are
+    plain functions, bump `version` when the hook depends on anything else, like
+    the methods of a class or data read from files.
+
+    Several hooks may share a `cache_path`, each one keeps its own entry.
+    """
+
+    def __init__(
+        self: "_PureHook",
+        func: Callable[[Any], None],
+        path: Optional[str],
+        cache_path: Optional[str],
+        version: Optional[str] = None,
+    ) -> None:
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = getattr(func, "__qualname__", repr(func))
+        self.path = path
+        self.cache: Dict[str, Any] = {}
+        self.cache_path = cache_path
+        self.version = version
+        module = getattr(func, "__module__", None)
+        self.entry = f"{type(self).__name__}:{module}.{self.name}:{path}"
+        state = (version, _state(func, set()))
+        self.code = hashlib.sha256(repr(state).encode("utf-8")).hexdigest()
+        if cache_path is not None:
+            self.load()
+            atexit.register(self._save_at_exit)
+
+    def load(self: "_PureHook") -> None:
+        """Load the cache from disk, any failure being treated as a cache miss."""
+        if not os.path.exists(self.cache_path):  # type: ignore
+            return
+        try:
+            entries = _read_entries(self.cache_path)  # type: ignore
+            if self.entry not in entries:
+                return
+            code, content = entries[self.entry]
+            if code != self.code:
+                LOGGER.info(f"Discarding the cache of '{self.name}'.")
+                return
+            self.cache = pickle.loads(content)
+        except Exception:
+            LOGGER.warning(f"Ignoring the unreadable cache of '{self.name}'.")
+
+    def save(self: "_PureHook") -> None:
+        """Write the cache atomically, processes may share the same file.
+
+        The entries of the other hooks sharing the file are kept.
+        """
+        entries: Dict[str, Tuple[str, bytes]] = {}
+        try:
+            entries = _read_entries(self.cache_path)  # type: ignore
+        except Exception:
+            pass
+        entries[self.entry] = (self.code, pickle.dumps(self.cache))
+        directory = os.path.dirname(os.path.abspath(self.cache_path))  # type: ignore
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temporary_fd:
+                pickle.dump(entries, temporary_fd)
+            os.replace(temporary, self.cache_path)  # type: ignore
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def _save_at_exit(self: "_PureHook") -> None:
+        try:
+            self.save()
+        except Exception:
+            LOGGER.warning(f"Could not save the cache of '{self.name}'.")
+
+    def _key(self: "_PureHook", subtree: Any) -> Optional[str]:
+        try:
+            return fingerprint(subtree)
+        except TypeError:
+            return None
+
+
+class PureValidator(_PureHook):
+    """Validator that only looks at one subtree of the configuration.
+
+    The exception it raised, if any, is cached and raised again for any config
+    whose subtree is identical.
+    """
+
+    def __call__(self: "PureValidator", config: Schema) -> None:
+        subtree = _get_path(config, self.path)
+        key = self._key(subtree)
+        if key is not None and key in self.cache:
+            exception = self.cache[key]
+            if exception is not None:
+                raise copy.copy(exception)
+            return
+        try:
+            self.func(subtree)
+        except Exception as exception:
+            if key is not None:
+                self.cache[key] = exception
+            raise
+        if key is not None:
+            self.cache[key] = None
+
+
+def _diff(before: Any, after: Any, path: Tuple[str, ...]) -> List[Tuple]:
+    """List the (path, value) that changed between two versions of a dataclass."""
+    changes: List[Tuple] = []
+    for field in fields(after):
+        old, new = getattr(before, field.name), getattr(after, field.name)
+        if is_dataclass(new) and type(old) is type(new):
+            changes.extend(_diff(old, new, path + (field.name,)))
+        elif old != new:
+            # Later hooks may mutate this config, the cache needs its own copy.
+            changes.append((path + (field.name,), copy.deepcopy(new)))
+    return changes
+
+
+class PureModifier(_PureHook):
+    """Modifier that only looks at and changes one subtree of the configuration.
+
+    The subtree has to be a dataclass which the modifier updates in place. The
+    changes it made are cached and replayed on any identical subtree.
+    """
+
+    def __call__(self: "PureModifier", config: Schema) -> None:
+        subtree = _get_path(config, self.path)
+        key = self._key(subtree)
+        if key is None:
+            self.func(subtree)
+            return
+        if key not in self.cache:
+            before = copy.deepcopy(subtree)
+            self.func(subtree)
+            self.cache[key] = _diff(before, subtree, ())
+            return
+        for path, value in self.cache[key]:
+            parent = _get_path(subtree, ".".join(path[:-1]))
+            setattr(parent, path[-1], copy.deepcopy(value))
+
+
+def pure_validator(
+    path: str = None, cache_path: str = None, version: str = None
+) -> Callable[[Callable[[Any], None]], PureValidator]:
+    """Declare a validator as a pure function of the subtree found at `path`.
+
+    The validator is called with that subtree instead of the whole config.
+
+    In [1]: @pure_validator("engine_config")
+       ...: def check_hive_version(engine_config: EngineConfigSchema) -> None:
+       ...:     assert engine_config.hive_settings.hive_version >= "2"
+    """
+    return lambda func: PureValidator(func, path, cache_path, version)
+
+
+def pure_modifier(
+    path: str = None, cache_path: str = None, version: str = None
+) -> Callable[[Callable[[Any], None]], PureModifier]:
+    """Declare a modifier as a pure function of the subtree found at `path`.
+
+    The modifier is called with that subtree instead of the whole config.
+    """
+    return lambda func: PureModifier(func, path, cache_path, version)
@@ -0,0 +1,132 @@
+import heapq
+import logging
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import ContextManager, Iterator, List, Optional, Tuple
+
+from configurator.schemas import Schema
+
+
+LOGGER = logging.getLogger(__file__)
+
+
+@dataclass
+class PhaseMemory(object):
+    """Memory used by a phase of the materialization, in bytes.
+
+    `peak` is the highest traced memory during the phase, including what earlier
+    phases retained. `retained` is how much the phase left allocated.
+    """
+
+    name: str
+    peak: int
+    retained: int
+
+
+@dataclass
+class MemoryReport(object):
+    phases: List[PhaseMemory] = field(default_factory=list)
+    largest_configs: List[Tuple[int, str]] = field(default_factory=list)
+
+    def __str__(self: "MemoryReport") -> str:
+        lines = ["Memory usage per phase:"]
+        for phase in self.phases:
+            lines.append(
+                f"  {phase.name}: peak {phase.peak} bytes, "
+                f"retained {phase.retained} bytes"
+            )
+        if self.largest_configs:
+            lines.append("Largest configs once serialized:")
+            for size, identity in sorted(self.largest_configs, reverse=True):
+                lines.append(f"  {identity}: {size} bytes")
+        return "\n".join(lines)
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """Raised when a materialization goes over its memory budget."""
+
+    def __init__(self: "MemoryBudgetExceeded", report: MemoryReport) -> None:
+        super().__init__(f"Memory budget exceeded.\n{report}")
+        self.report = report
+
+
+class MemoryTracker(object):
+    """Account for the memory used by each phase of `ConfigSet.materialize()`.
+
+    Memory is traced with `tracemalloc`, which slows the materialization down.
+    Sizing the largest configs serializes them once more before they are written.
+
+    When the traced memory goes over `budget` while resolving the configs, the
+    materialization fails with a `MemoryBudgetExceeded`. If `stream_on_budget`
+    is set and the configset has no set level hooks, it instead switches to
+    writing each config as soon as it is validated and releasing its output.
+    Note that configs written that way are written even if a later one fails.
+
+    In [1]: tracker = MemoryTracker(budget=2 * 1024 ** 3)
+    In [2]: configset.materialize(memory=tracker)
+    In [3]: print(tracker.report)
+    """
+
+    def __init__(
+        self: "MemoryTracker",
+        budget: int = None,
+        stream_on_budget: bool = False,
+        top: int = 10,
+    ) -> None:
+        self.budget = budget
+        self.stream_on_budget = stream_on_budget
+        self.top = top
+        self.report = MemoryReport()
+
+    @contextmanager
+    def tracking(self: "MemoryTracker") -> Iterator["MemoryTracker"]:
+        """Trace memory for the duration of a materialization."""
+        self.report = MemoryReport()
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            yield self
+        finally:
+            if started:
+                tracemalloc.stop()
+            self.report.largest_configs.sort(reverse=True)
+            LOGGER.info(str(self.report))
+
+    @contextmanager
+    def phase(self: "MemoryTracker", name: str) -> Iterator[None]:
+        # Python < 3.9 can't reset the peak, it then covers all previous phases.
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.report.phases.append(PhaseMemory(name, peak, current - before))
+
+    def over_budget(self: "MemoryTracker") -> bool:
+        if self.budget is None:
+            return False
+        return tracemalloc.get_traced_memory()[0] > self.budget
+
+    def record_size(self: "MemoryTracker", identity: str, output: Schema) -> None:
+        """Keep track of the `top` largest configs by serialized size."""
+        size = len(str(output.serialize()))
+        if len(self.report.largest_configs) < self.top:
+            heapq.heappush(self.report.largest_configs, (size, identity))
+        else:
+            heapq.heappushpop(self.report.largest_configs, (size, identity))
+
+
+def phase(memory: Optional[MemoryTracker], name: str) -> ContextManager[None]:
+    """The tracker's phase, or nothing when memory is not being tracked."""
+    if memory is None:
+        return _nothing()
+    return memory.phase(name)
+
+
+@contextmanager
+def _nothing() -> Iterator[None]:
+    yield
@@ -0,0 +1,196 @@
+from typing import Any, Dict, Hashable, Iterable, List, Set
+
+
+class _Missing(object):
+    def __repr__(self: "_Missing") -> str:
+        return "MISSING"
+
+
+# Base of a merge onto a field that the template did not have.
+MISSING = _Missing()
+
+
+class MergeOperator(object):
+    """Template value that combines with the value it is merged onto.
+
+    `FlatTemplate.merge_from()`, which configs are resolved with, doesn't apply
+    operators right away, it chains them in a `PendingMerge`. The whole chain is
+    applied in one pass when the schema is instanciated: the base value is copied
+    once and every operator then updates that copy in place, so each layer only
+    costs the size of its own data. `Template.merge_from()` applies them eagerly.
+
+    Operators are also plain callables returning a new value, like any other
+    callable template value.
+    """
+
+    def empty(self: "MergeOperator") -> Any:
+        """Value to start from when merging onto a missing field."""
+        raise NotImplementedError()
+
+    def copy(self: "MergeOperator", value: Any) -> Any:
+        """Shallow copy of the base value that the operators can update."""
+        raise NotImplementedError()
+
+    def apply(self: "MergeOperator", value: Any, owned: Set[int]) -> Any:
+        """Update `value` in place and return it.
+
+        `owned` holds the ids of the containers copied during this pass, the
+        others may be shared with templates and must be copied before changing.
+        """
+        raise NotImplementedError()
+
+    def __call__(self: "MergeOperator", value: Any) -> Any:
+        value = self.empty() if value is MISSING else self.copy(value)
+        return self.apply(value, {id(value)})
+
+    def __eq__(self: "MergeOperator", other: object) -> bool:
+        return type(self) is type(other) and vars(self) == vars(other)
+
+    def __repr__(self: "MergeOperator") -> str:
+        return f"{type(self).__name__}({vars(self)})"
+
+
+class _DictOperator(MergeOperator):
+    def empty(self: "_DictOperator") -> Dict:
+        return {}
+
+    def copy(self: "_DictOperator", value: Dict) -> Dict:
+        return dict(value)
+
+
+class Update(_DictOperator):
+    """Shallow dictionary update, the keys of `data` replace the existing ones."""
+
+    def __init__(self: "Update", data: Dict) -> None:
+        self.data = data
+
+    def apply(self: "Update", value: Dict, owned: Set[int]) -> Dict:
+        value.update(self.data)
+        return value
+
+
+class DeepMerge(_DictOperator):
+    """Recursive dictionary merge, nested dictionaries are merged key by key."""
+
+    def __init__(self: "DeepMerge", data: Dict) -> None:
+        self.data = data
+
+    @staticmethod
+    def _merge(value: Dict, data: Dict, owned: Set[int]) -> None:
+        for key, new in data.items():
+            old = value.get(key)
+            if isinstance(new, dict) and isinstance(old, dict):
+                if id(old) not in owned:
+                    old = value[key] = dict(old)
+                    owned.add(id(old))
+                DeepMerge._merge(old, new, owned)
+            else:
+                value[key] = new
+
+    def apply(self: "DeepMerge", value: Dict, owned: Set[int]) -> Dict:
+        DeepMerge._merge(value, self.data, owned)
+        return value
+
+
+class Remove(_DictOperator):
+    """Delete keys from a dictionary, missing keys are ignored."""
+
+    def __init__(self: "Remove", *keys: Hashable) -> None:
+        self.keys = keys
+
+    def apply(self: "Remove", value: Dict, owned: Set[int]) -> Dict:
+        for key in self.keys:
+            value.pop(key, None)
+        return value
+
+
+class _ListOperator(MergeOperator):
+    def empty(self: "_ListOperator") -> List:
+        return []
+
+    def copy(self: "_ListOperator", value: List) -> List:
+        return list(value)
+
+
+class Append(_ListOperator):
+    """Add one element at the end of a list."""
+
+    def __init__(self: "Append", item: Any) -> None:
+        self.item = item
+
+    def apply(self: "Append", value: List, owned: Set[int]) -> List:
+        value.append(self.item)
+        return value
+
+
+class Extend(_ListOperator):
+    """Add elements at the end of a list."""
+
+    def __init__(self: "Extend", items: Iterable) -> None:
+        self.items = list(items)
+
+    def apply(self: "Extend", value: List, owned: Set[int]) -> List:
+        value.extend(self.items)
+        return value
+
+
+class SetUnion(MergeOperator):
+    """Add elements to a set."""
+
+    def __init__(self: "SetUnion", items: Iterable) -> None:
+        self.items = set(items)
+
+    def empty(self: "SetUnion") -> Set:
+        return set()
+
+    def copy(self: "SetUnion", value: Set) -> Set:
+        return set(value)
+
+    def apply(self: "SetUnion", value: Set, owned: Set[int]) -> Set:
+        value |= self.items
+        return value
+
+
+class PendingMerge(object):
+    """Chain of operators waiting to be applied onto a base value.
+
+    Chains are immutable so that they can be shared between templates: merging
+    one more operator links a new `PendingMerge` to the previous one.
+    """
+
+    __slots__ = ["previous", "operator"]
+
+    def __init__(self: "PendingMerge", previous: Any, operator: MergeOperator) -> None:
+        self.previous = previous
+        self.operator = operator
+
+    def __eq__(self: "PendingMerge", other: object) -> bool:
+        return (
+            isinstance(other, PendingMerge)
+            and self.operator == other.operator
+            and self.previous == other.previous
+        )
+
+    def __repr__(self: "PendingMerge") -> str:
+        return f"PendingMerge({self.previous!r}, {self.operator!r})"
+
+    def resolve(self: "PendingMerge") -> Any:
+        operators = []
+        pending: Any = self
+        while isinstance(pending, PendingMerge):
+            operators.append(pending.operator)
+            pending = pending.previous
+        operators.reverse()
+        first = operators[0]
+        value = first.empty() if pending is MISSING else first.copy(pending)
+        owned = {id(value)}
+        for operator in operators:
+            value = operator.apply(value, owned)
+        return value
+
+
+def resolve_pending(value: Any) -> Any:
+    """Apply the pending operators of a value, if any."""
+    if isinstance(value, PendingMerge):
+        return value.resolve()
+    return value
@@ -0,0 +1,199 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from configurator.schemas import DictSchema, Schema
+
+
+LOGGER = logging.getLogger(__file__)
+
+Patch = List[Dict[str, Any]]
+
+
+def _normalize(value: Any) -> Any:
+    """Turn serialized data into something json can represent."""
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_normalize(item) for item in value), key=repr)
+    return value
+
+
+def to_data(output: Schema) -> Any:
+    """Data of a config to diff, DictSchema are diffed field by field."""
+    if isinstance(output, DictSchema):
+        return _normalize(DictSchema.serialize(output))
+    return output.serialize()
+
+
+def _digest(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def hash_tree(data: Any) -> Dict[str, Any]:
+    """Hash every subtree of `data` so that equal subtrees can be skipped."""
+    if isinstance(data, dict):
+        keys = {key: hash_tree(value) for key, value in data.items()}
+        content = "".join(f"{json.dumps(k)}:{keys[k]['hash']}" for k in sorted(keys))
+        return {"hash": _digest("{" + content), "keys": keys}
+    if isinstance(data, list):
+        items = [hash_tree(value) for value in data]
+        content = ",".join(item["hash"] for item in items)
+        return {"hash": _digest("[" + content), "items": items}
+    return {"hash": _digest(json.dumps(data, sort_keys=True))}
+
+
+def _escape(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def diff(old: Any, old_tree: Dict, new: Any, new_tree: Dict, path: str = "") -> Patch:
+    """JSON-Patch operations turning `old` into `new`.
+
+    Subtrees with the same hash are skipped without being looked at. Lists that
+    changed length are replaced as a whole.
+    """
+    if old_tree["hash"] == new_tree["hash"]:
+        return []
+    if "keys" in old_tree and "keys" in new_tree:
+        patch: Patch = []
+        for key in old:
+            if key not in new:
+                patch.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            key_path = f"{path}/{_escape(key)}"
+            if key not in old:
+                patch.append({"op": "add", "path": key_path, "value": value})
+            else:
+                patch.extend(
+                    diff(
+                        old[key],
+                        old_tree["keys"][key],
+                        value,
+                        new_tree["keys"][key],
+                        key_path,
+                    )
+                )
+        return patch
+    if "items" in old_tree and "items" in new_tree and len(old) == len(new):
+        patch = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            patch.extend(
+                diff(
+                    old_item,
+                    old_tree["items"][index],
+                    new_item,
+                    new_tree["items"][index],
+                    f"{path}/{index}",
+                )
+            )
+        return patch
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+class PatchManifest(object):
+    """Data and hashes of every config of the previous build, by config identity.
+
+    Materializing with a manifest diffs every config against it and then
+    records the new build in it, so it should be saved once materialized.
+    Configs that are no longer built are only dropped by `prune()`.
+
+    In [1]: manifest = PatchManifest.load("build/manifest.json")
+    In [2]: configset.materialize(patches=manifest)
+    In [3]: removed = manifest.prune()
+    In [4]: manifest.dump("build/manifest.json")
+    """
+
+    def __init__(self: "PatchManifest", entries: Dict[str, Dict] = None) -> None:
+        self.entries = entries or {}
+        self.seen: Set[str] = set()
+
+    @staticmethod
+    def load(path: str) -> "PatchManifest":
+        """Load a manifest, starting from an empty one if there is none yet."""
+        if not os.path.exists(path):
+            return PatchManifest()
+        with open(path) as fd:
+            return PatchManifest(json.load(fd))
+
+    @staticmethod
+    def from_files(paths: Dict[str, str]) -> "PatchManifest":
+        """Build a manifest out of the json files written by the previous build."""
+        entries = {}
+        for identity, path in paths.items():
+            if os.path.exists(path):
+                with open(path) as fd:
+                    data = json.load(fd)
+                entries[identity] = {"data": data, "tree": hash_tree(data)}
+        return PatchManifest(entries)
+
+    def dump(self: "PatchManifest", path: str) -> None:
+        with open(path, "w") as fd:
+            json.dump(self.entries, fd)
+
+    def update(self: "PatchManifest", identity: str, output: Schema) -> Patch:
+        """Record the new output of a config and return what changed."""
+        data = to_data(output)
+        tree = hash_tree(data)
+        self.seen.add(identity)
+        previous = self.entries.get(identity)
+        self.entries[identity] = {"data": data, "tree": tree}
+        if previous is None:
+            return [{"op": "add", "path": "", "value": data}]
+        return diff(previous["data"], previous["tree"], data, tree)
+
+    def prune(self: "PatchManifest") -> Dict[str, Patch]:
+        """Drop the configs that were not updated and return their removal patch.
+
+        Call it once every configset using this manifest was materialized, the
+        shards of a configset included.
+        """
+        removed = {
+            identity: [{"op": "remove", "path": ""}]
+            for identity in self.entries
+            if identity not in self.seen
+        }
+        for identity in removed:
+            del self.entries[identity]
+        return removed
+
+
+def patch_writer(writer: Callable[..., None]) -> Callable[..., None]:
+    """Mark a writer as taking patches rather than the full config.
+
+    Such writers are only called when the config changed since the manifest.
+    """
+    writer.writes_patches = True  # type: ignore
+    return writer
+
+
+def writes_patches(writer: Any) -> bool:
+    if isinstance(writer, functools.partial):
+        writer = writer.func
+    return getattr(writer, "writes_patches", False) is True
+
+
+def apply_patch(data: Any, patch: Patch) -> Any:
+    """Apply the operations produced by `diff()`, mostly useful for testing."""
+    for operation in patch:
+        if not operation["path"]:
+            data = operation.get("value")
+            continue
+        *parents, last = [
+            part.replace("~1", "/").replace("~0", "~")
+            for part in operation["path"].split("/")[1:]
+        ]
+        node = data
+        for part in parents:
+            node = node[int(part) if isinstance(node, list) else part]
+        key: Optional[Any] = int(last) if isinstance(node, list) else last
+        if operation["op"] == "remove":
+            del node[key]
+        else:
+            node[key] = operation["value"]
+    return data
@@ -2,7 +2,8 @@ import json
 import string
 from collections import Hashable
 from dataclasses import dataclass, fields, is_dataclass
-from typing import Any, Dict
+from json.encoder import encode_basestring_ascii
+from typing import Any, Dict, List
 
 
 @dataclass
@@ -60,6 +61,137 @@ class DictSchema(Schema):
         return data
 
 
+# Field names of each schema class, sorted the way `json.dumps` would.
+_SORTED_FIELDS: Dict[type, List[str]] = {}
+
+
+def _sorted_fields(schema: type) -> List[str]:
+    try:
+        return _SORTED_FIELDS[schema]
+    except KeyError:
+        names = _SORTED_FIELDS[schema] = sorted(field.name for field in fields(schema))
+        return names
+
+
+class _Unsupported(Exception):
+    """Raised when the direct encoder can't guarantee the output of `json.dumps`."""
+
+
+def _encode_float(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "Infinity"
+    if value == -float("inf"):
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def _encode_json(value: Any, indent: str, chunks: List[str]) -> None:
+    """Encode a plain value exactly like `json.dumps(sort_keys=True, indent=4)`."""
+    kind = type(value)
+    if kind is str:
+        chunks.append(encode_basestring_ascii(value))
+    elif value is None:
+        chunks.append("null")
+    elif value is True:
+        chunks.append("true")
+    elif value is False:
+        chunks.append("false")
+    elif kind is int:
+        chunks.append(int.__repr__(value))
+    elif kind is float:
+        chunks.append(_encode_float(value))
+    elif kind is dict:
+        if not all(type(key) is str for key in value):
+            raise _Unsupported()
+        _encode_items(
+            [(key, value[key]) for key in sorted(value)], _encode_json, indent, chunks
+        )
+    elif kind is list or kind is tuple:
+        if not value:
+            chunks.append("[]")
+            return
+        inner = indent + "    "
+        separator = "[\n" + inner
+        for element in value:
+            chunks.append(separator)
+            _encode_json(element, inner, chunks)
+            separator = ",\n" + inner
+        chunks.append("\n" + indent + "]")
+    else:
+        raise _Unsupported()
+
+
+def _encode_items(items: List, encode: Any, indent: str, chunks: List[str]) -> None:
+    if not items:
+        chunks.append("{}")
+        return
+    inner = indent + "    "
+    separator = "{\n" + inner
+    for key, value in items:
+        chunks.append(separator)
+        chunks.append(encode_basestring_ascii(key))
+        chunks.append(": ")
+        encode(value, inner, chunks)
+        separator = ",\n" + inner
+    chunks.append("\n" + indent + "}")
+
+
+def _encode_serialized(value: Any, indent: str, chunks: List[str]) -> None:
+    """Encode a value the way `DictSchema.serialize()` would have represented it."""
+    if isinstance(value, Schema):
+        if type(value).serialize is DictSchema.serialize:
+            _encode_schema(value, indent, chunks)
+        else:
+            _encode_json(value.serialize(), indent, chunks)
+    else:
+        _encode_json(value, indent, chunks)
+
+
+def _encode_field(value: Any, indent: str, chunks: List[str]) -> None:
+    """Encode a field of a DictSchema, following `DictSchema.serialize()`."""
+    if isinstance(value, list):
+        if not value:
+            chunks.append("[]")
+            return
+        inner = indent + "    "
+        separator = "[\n" + inner
+        for element in value:
+            chunks.append(separator)
+            if is_dataclass(element):
+                if type(element).serialize is DictSchema.serialize:
+                    _encode_schema(element, inner, chunks)
+                else:
+                    _encode_json(element.serialize(), inner, chunks)
+            else:
+                _encode_json(element, inner, chunks)
+            separator = ",\n" + inner
+        chunks.append("\n" + indent + "]")
+    elif isinstance(value, set):
+        raise _Unsupported()
+    elif isinstance(value, dict):
+        if not all(type(key) is str for key in value):
+            raise _Unsupported()
+        _encode_items(
+            [(key, value[key]) for key in sorted(value)],
+            _encode_serialized,
+            indent,
+            chunks,
+        )
+    else:
+        _encode_serialized(value, indent, chunks)
+
+
+def _encode_schema(schema: "DictSchema", indent: str, chunks: List[str]) -> None:
+    _encode_items(
+        [(name, getattr(schema, name)) for name in _sorted_fields(type(schema))],
+        _encode_field,
+        indent,
+        chunks,
+    )
+
+
 @dataclass
 class JsonSchema(DictSchema):
     """Schema of a configuration that will be serialized as a json.
@@ -69,7 +201,14 @@ class JsonSchema(DictSchema):
     """
 
     def serialize(self: "JsonSchema") -> str:
-        return json.dumps(super().serialize(), sort_keys=True, indent=4)
+        # Walk the schema directly rather than building the dictionary first.
+        # What the walk can't encode exactly like `json.dumps` falls back on it.
+        chunks: List[str] = []
+        try:
+            _encode_schema(self, "", chunks)
+        except (_Unsupported, RecursionError):
+            return json.dumps(super().serialize(), sort_keys=True, indent=4)
+        return "".join(chunks)
 
 
 @dataclass
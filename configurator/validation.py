@@ -0,0 +1,105 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from configurator.schemas import Schema
+
+
+LOGGER = logging.getLogger(__file__)
+
+
+@dataclass
+class ValidationFailure(object):
+    """A validator that raised on a config."""
+
+    config: str
+    validator: str
+    message: str
+    exception: Exception
+
+
+@dataclass
+class ValidationReport(object):
+    """All the failures of a validation run.
+
+    `cancelled` is set when the run stopped early because too many validators
+    failed, in which case some validators have not been run at all.
+    """
+
+    failures: List[ValidationFailure] = field(default_factory=list)
+    cancelled: bool = False
+
+    def grouped(self: "ValidationReport") -> Dict[str, Dict[str, List[str]]]:
+        """Failure messages grouped by config then by validator."""
+        grouped: Dict[str, Dict[str, List[str]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        for failure in self.failures:
+            grouped[failure.config][failure.validator].append(failure.message)
+        return {config: dict(validators) for config, validators in grouped.items()}
+
+    def __str__(self: "ValidationReport") -> str:
+        lines = [f"{len(self.failures)} validation failures:"]
+        for config, validators in sorted(self.grouped().items()):
+            lines.append(f"  {config}:")
+            for validator, messages in sorted(validators.items()):
+                for message in messages:
+                    lines.append(f"    {validator}: {message}")
+        if self.cancelled:
+            lines.append("Validation was stopped early, some validators did not run.")
+        return "\n".join(lines)
+
+
+class ValidationError(Exception):
+    """Raised with the report of a validation run that had failures."""
+
+    def __init__(self: "ValidationError", report: ValidationReport) -> None:
+        super().__init__(str(report))
+        self.report = report
+
+
+def _name(validator: Callable) -> str:
+    return getattr(validator, "__qualname__", repr(validator))
+
+
+def validate_concurrently(
+    configs: List[Tuple[str, Schema, List[Callable[[Schema], None]]]],
+    max_workers: int = None,
+    max_failures: int = None,
+) -> ValidationReport:
+    """Run every validator of every config and collect all the failures.
+
+    `configs` holds the identity, resolved output and validators of each config.
+    Validators run on a thread pool, which pays off for validators waiting on
+    I/O. As soon as `max_failures` failures have been collected the validators
+    that have not started yet are cancelled.
+    """
+    report = ValidationReport()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures: Dict[Future, Tuple[str, Callable]] = {
+            executor.submit(validator, output): (identity, validator)
+            for identity, output, validators in configs
+            for validator in validators
+        }
+        for future in as_completed(futures):
+            exception = future.exception()
+            if exception is None:
+                continue
+            identity, validator = futures[future]
+            report.failures.append(
+                ValidationFailure(
+                    config=identity,
+                    validator=_name(validator),
+                    message=f"{type(exception).__name__}: {exception}",
+                    exception=exception,  # type: ignore
+                )
+            )
+            if max_failures is not None and len(report.failures) >= max_failures:
+                LOGGER.info(f"Reached {max_failures} failures, stopping validation.")
+                report.cancelled = True
+                for pending in futures:
+                    pending.cancel()
+                break
+    return report
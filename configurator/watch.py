@@ -0,0 +1,187 @@
+import importlib
+import logging
+import os
+import sys
+import time
+from types import ModuleType
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+from configurator.compiler import ConfigSet, Template
+
+
+LOGGER = logging.getLogger(__file__)
+
+
+def _stat(module: ModuleType) -> Tuple[int, int]:
+    stat = os.stat(module.__file__)  # type: ignore
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _walk_templates(template: Template) -> Iterator[Template]:
+    yield template
+    for field in template.fields:
+        value = getattr(template, field)
+        if isinstance(value, Template):
+            yield from _walk_templates(value)
+
+
+def _module_templates(module: ModuleType) -> Iterator[Template]:
+    for value in list(vars(module).values()):
+        if isinstance(value, Template):
+            yield from _walk_templates(value)
+
+
+class Watcher(object):
+    """Keep a warm process and rebuild configsets when template modules change.
+
+    Modules are polled by comparing their file's mtime and size, so this works
+    on any filesystem. Configsets are produced by factories so that they can be
+    rebuilt with the reloaded templates. Modules that imported templates by name
+    (`from examples.hadoop_templates import hive_cluster_config`) are reloaded
+    too so that factories defined there see the new objects. `__main__` can't be
+    reloaded, factories defined there must look templates up on the module.
+
+    In [1]: from examples import hadoop_templates
+    In [2]: watcher = Watcher([hadoop_templates], [build_hive_clusters])
+    In [3]: watcher.run()
+    """
+
+    def __init__(
+        self: "Watcher",
+        modules: List[ModuleType],
+        factories: List[Callable[[], ConfigSet]],
+        interval: float = 0.5,
+    ) -> None:
+        self.modules = {module.__name__: module for module in modules}
+        self.factories = factories
+        self.interval = interval
+        self.stats = {name: _stat(module) for name, module in self.modules.items()}
+        self.dependencies: Dict[int, Set[str]] = {}
+
+    def _template_owners(self: "Watcher") -> Dict[int, str]:
+        """Map the id of every template defined in a watched module to its module."""
+        owners = {}
+        for name, module in self.modules.items():
+            for template in _module_templates(module):
+                owners[id(template)] = name
+        return owners
+
+    def build(self: "Watcher", factory: Callable[[], ConfigSet]) -> None:
+        """Materialize a configset and record which watched modules it uses."""
+        try:
+            configset = factory()
+            # Lazy configsets release their templates so we need to hold them here.
+            configset.configs = list(configset.iter_configs())
+        except Exception:
+            # Without its templates, any change may be the one fixing the factory.
+            self.dependencies[id(factory)] = set(self.modules)
+            raise
+        owners = self._template_owners()
+        # Module templates may be nested in the config's own overlays.
+        dependencies = {
+            owners[id(nested)]
+            for config in configset.configs
+            for template in config.templates
+            if isinstance(template, Template)
+            for nested in _walk_templates(template)
+            if id(nested) in owners
+        }
+        lost = self.dependencies.get(id(factory), set()) - dependencies
+        if lost:
+            LOGGER.warning(
+                f"Configset no longer uses the templates of {sorted(lost)}, it may"
+                " hold stale copies. Still rebuilding it when they change."
+            )
+            dependencies |= lost
+        self.dependencies[id(factory)] = dependencies
+        configset.materialize()
+
+    def safe_build(self: "Watcher", factory: Callable[[], ConfigSet]) -> None:
+        """Build a configset, logging failures instead of leaving the process."""
+        try:
+            self.build(factory)
+        except Exception:
+            LOGGER.exception("Failed to build configset, waiting for changes.")
+
+    def changed_modules(self: "Watcher") -> Set[str]:
+        """Return the watched modules whose file changed since the last poll."""
+        changed = set()
+        for name, module in self.modules.items():
+            try:
+                stat = _stat(module)
+            except OSError:
+                # Editors saving through a rename leave the file briefly missing.
+                LOGGER.debug(f"Could not stat '{name}', checking it next time.")
+                continue
+            if stat != self.stats[name]:
+                self.stats[name] = stat
+                changed.add(name)
+        return changed
+
+    def _reload(self: "Watcher", changed: Set[str]) -> Set[str]:
+        """Reload the changed modules then the modules importing their templates.
+
+        Returns the watched modules that were successfully reloaded.
+        """
+        reloaded = set()
+        pending = sorted(changed)
+        seen = set(pending)
+        while pending:
+            name = pending.pop(0)
+            module = self.modules.get(name) or sys.modules[name]
+            stale = {id(template) for template in _module_templates(module)}
+            LOGGER.info(f"Reloading '{name}'.")
+            try:
+                module = importlib.reload(module)
+            except Exception:
+                LOGGER.exception(f"Failed to reload '{name}', waiting for changes.")
+                continue
+            if name in self.modules:
+                self.modules[name] = module
+                reloaded.add(name)
+            for importer_name, importer in list(sys.modules.items()):
+                if importer_name in seen or not hasattr(importer, "__dict__"):
+                    continue
+                if not any(id(value) in stale for value in vars(importer).values()):
+                    continue
+                seen.add(importer_name)
+                if importer_name == "__main__":
+                    LOGGER.warning(
+                        f"'__main__' imported templates from '{name}' by name,"
+                        " its factories will keep using the stale ones."
+                    )
+                else:
+                    pending.append(importer_name)
+        return reloaded
+
+    def step(self: "Watcher") -> List[Callable[[], ConfigSet]]:
+        """Poll once, reload changed modules and rebuild the affected configsets.
+
+        Returns the factories that were rebuilt.
+        """
+        changed = self.changed_modules()
+        if not changed:
+            return []
+        changed = self._reload(changed)
+        rebuilt = [
+            factory
+            for factory in self.factories
+            if self.dependencies.get(id(factory), set()) & changed
+        ]
+        for factory in rebuilt:
+            self.safe_build(factory)
+        return rebuilt
+
+    def run(self: "Watcher") -> None:
+        """Build everything once then rebuild on change until interrupted."""
+        for factory in self.factories:
+            self.safe_build(factory)
+        LOGGER.info(f"Watching {len(self.modules)} modules for changes.")
+        try:
+            while True:
+                start = time.monotonic()
+                if self.step():
+                    LOGGER.info(f"Rebuilt in {time.monotonic() - start:.3f}s.")
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            LOGGER.info("Stopped watching.")
@@ -5,6 +5,7 @@ import os
 import logging
 
 from configurator.compiler import Schema
+from configurator.patch import Patch, patch_writer
 
 
 LOGGER = logging.getLogger(__file__)
@@ -29,3 +30,18 @@ def file_writer(config: Schema, path: str) -> None:
     with open(path, "w") as fd:
         LOGGER.info(f"Writting out configuration in '{path}'.")
         fd.write(data + "\n")
+
+
+@patch_writer
+def patch_file_writer(patch: Patch, path: str) -> None:
+    """Write out the changes of a configuration since the previous build.
+
+    The patch is a json list of JSON-Patch operations, use it in conjuction with
+    `partial()` like `file_writer` and materialize with a `PatchManifest`.
+    """
+    directory = os.path.dirname(path)
+    LOGGER.info(f"Making sure the directory '{directory}' exists.")
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as fd:
+        LOGGER.info(f"Writting out configuration patch in '{path}'.")
+        fd.write(json.dumps(patch, sort_keys=True, indent=4) + "\n")
@@ -1,8 +1,7 @@
-from typing import Callable, Dict
+from typing import Dict
 
+from configurator.operators import Update
 
-def merge_dict(new_dict: Dict) -> Callable[[Dict], Dict]:
-    def merger(old_dict: Dict) -> Dict:
-        return dict(list(old_dict.items()) + list(new_dict.items()))
 
-    return merger
+def merge_dict(new_dict: Dict) -> Update:
+    return Update(new_dict)
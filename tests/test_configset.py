@@ -1,7 +1,9 @@
+from concurrent.futures import ProcessPoolExecutor
+
 import pytest
 from mock import Mock, call
 
-from configurator.compiler import ConfigSet
+from configurator.compiler import Config, ConfigSet, Template
 from tests.common import TestException, TestSimpleSchema
 
 
@@ -59,3 +61,102 @@ def test_materialization_failures(config_validator, configset_validator):
         configset.materialize()
 
     assert not writer.called
+
+
+def make_sharded_configset(writer, configset_validator):
+    return ConfigSet(
+        configs=[
+            Config(
+                schema=TestSimpleSchema,
+                writer=writer,
+                templates=[Template(a=index, b=2)],
+                name=f"config-{index}",
+            )
+            for index in range(20)
+        ],
+        configset_validators=[configset_validator],
+    )
+
+
+def materialize_shard(shard):
+    configset = make_sharded_configset(Mock(), Mock())
+    return configset.materialize(shard=shard, num_shards=3)
+
+
+def test_sharded_materialization():
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        manifests = list(executor.map(materialize_shard, range(3)))
+    configset_validator = Mock()
+    configset = make_sharded_configset(Mock(), configset_validator)
+
+    merged = configset.merge_shards(manifests)
+
+    assert sum(len(manifest.outputs) for manifest in manifests) == 20
+    assert merged == [TestSimpleSchema(a=index, b=2) for index in range(20)]
+    assert configset_validator.call_args == call(merged)
+    # Assignment is stable from one run to the next.
+    assert manifests == [materialize_shard(shard) for shard in range(3)]
+
+
+def test_sharded_merge_requires_all_shards():
+    configset = make_sharded_configset(Mock(), Mock())
+    manifests = [configset.materialize(shard=shard, num_shards=3) for shard in (0, 2)]
+
+    with pytest.raises(ValueError):
+        configset.merge_shards(manifests)
+
+
+def test_sharding_refuses_configset_modifiers():
+    configset = ConfigSet(configs=[], configset_modifiers=[Mock()])
+
+    with pytest.raises(ValueError):
+        configset.materialize(shard=0, num_shards=2)
+
+
+def test_lazy_configs_are_consumed_on_demand():
+    mock_manager = Mock()
+    writer = create_and_attach_mock(mock_manager, "writer")
+    built = []
+
+    def generate_configs():
+        for index in range(3):
+            built.append(index)
+            yield Config(
+                schema=TestSimpleSchema,
+                writer=writer,
+                templates=[Template(a=index, b=2)],
+            )
+
+    configset = ConfigSet(configs=generate_configs)
+    assert built == []
+
+    configset.materialize()
+
+    assert built == [0, 1, 2]
+    assert mock_manager.mock_calls == [
+        call.writer(TestSimpleSchema(a=index, b=2)) for index in range(3)
+    ]
+
+
+def test_lazy_configs_release_templates():
+    configs = [
+        Config(schema=TestSimpleSchema, writer=Mock(), templates=[Template(a=1, b=2)])
+    ]
+
+    ConfigSet(configs=iter(configs)).materialize()
+
+    assert configs[0].templates == []
+    assert configs[0].output == TestSimpleSchema(a=1, b=2)
+
+
+def test_lazy_configs_are_not_written_on_failure():
+    writer = Mock()
+
+    def generate_configs():
+        yield Config(TestSimpleSchema, writer, templates=[Template(a=1, b=2)])
+        yield Config(TestSimpleSchema, writer, templates=[Template(a=1)])
+
+    with pytest.raises(TypeError):
+        ConfigSet(configs=generate_configs).materialize()
+
+    assert not writer.called
@@ -0,0 +1,87 @@
+import pytest
+from mock import Mock
+
+from configurator.compiler import (
+    Config,
+    ConfigSet,
+    ConformanceIssue,
+    FlatTemplate,
+    Template,
+    TemplateConformanceError,
+    find_conformance_issues,
+)
+from tests.common import TestNestedSchema, TestSimpleSchema
+
+
+@pytest.mark.parametrize(
+    ["schema", "templates", "expected"],
+    [
+        (TestSimpleSchema, [Template(a=1), Template(b=2)], []),
+        (
+            TestNestedSchema,
+            [Template(simple=1, nested=Template(a=1)), Template(nested=Template(b=2))],
+            [],
+        ),
+        (TestNestedSchema, [Template(simple=1, nested=TestSimpleSchema(1, 2))], []),
+        (
+            TestNestedSchema,
+            [FlatTemplate({"simple": 1, "nested.a": 1, "nested.b": 2})],
+            [],
+        ),
+        (
+            TestSimpleSchema,
+            [Template(a=1, b=2), Template(c=3)],
+            [ConformanceIssue("0", 1, "c", "unknown")],
+        ),
+        (
+            TestNestedSchema,
+            [Template(simple=1, nested=Template(a=1, typo=2))],
+            [
+                ConformanceIssue("0", 0, "nested.typo", "unknown"),
+                ConformanceIssue("0", None, "nested.b", "missing"),
+            ],
+        ),
+        (
+            TestNestedSchema,
+            [Template(simple=Template(a=1), nested=Template(a=1, b=2))],
+            [ConformanceIssue("0", 0, "simple", "nested")],
+        ),
+        (
+            # A value replacing a nested template doesn't need its fields.
+            TestNestedSchema,
+            [Template(simple=1, nested=Template(a=1)), Template(nested=None)],
+            [],
+        ),
+    ],
+)
+def test_conformance(schema, templates, expected):
+    config = Config(schema=schema, writer=Mock(), templates=templates)
+
+    assert find_conformance_issues([config]) == expected
+
+
+def test_all_configs_are_reported_before_materializing():
+    writer = Mock()
+    configset = ConfigSet(
+        configs=[
+            Config(TestSimpleSchema, writer, [Template(a=1)], name="first"),
+            Config(TestSimpleSchema, writer, [Template(a=1, b=2)], name="valid"),
+            Config(TestSimpleSchema, writer, [Template(a=1, b=2, c=3)], name="last"),
+        ]
+    )
+
+    with pytest.raises(TemplateConformanceError) as error:
+        configset.materialize(check_templates=True)
+
+    assert error.value.issues == [
+        ConformanceIssue("first", None, "b", "missing"),
+        ConformanceIssue("last", 0, "c", "unknown"),
+    ]
+    assert not writer.called
+
+
+def test_one_shot_iterators_are_refused():
+    configset = ConfigSet(configs=iter([]))
+
+    with pytest.raises(ValueError):
+        configset.check_templates()
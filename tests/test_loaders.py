@@ -0,0 +1,138 @@
+import json
+import os
+from textwrap import dedent
+
+import pytest
+from mock import Mock
+
+from configurator import loaders
+from configurator.compiler import Template
+from configurator.loaders import load_template
+from tests.common import TestNestedSchema
+
+
+def test_load_json(tmp_path):
+    path = tmp_path / "template.json"
+    path.write_text(json.dumps({"simple": {"c": 1}, "nested": {"a": 1, "b": 2}}))
+
+    assert load_template(str(path)) == Template(
+        simple=Template(c=1), nested=Template(a=1, b=2)
+    )
+
+
+def test_load_with_schema_keeps_dict_values(tmp_path):
+    path = tmp_path / "template.json"
+    path.write_text(json.dumps({"simple": {"c": 1}, "nested": {"a": 1}}))
+
+    assert load_template(str(path), TestNestedSchema) == Template(
+        simple={"c": 1}, nested=Template(a=1)
+    )
+
+
+def test_load_yaml(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "template.yaml"
+    path.write_text("simple: 1\nnested:\n  a: 1\n  b: [2, 3]\n")
+
+    assert load_template(str(path)) == Template(
+        simple=1, nested=Template(a=1, b=[2, 3])
+    )
+
+
+def test_load_properties(tmp_path):
+    path = tmp_path / "template.properties"
+    path.write_text(
+        dedent(
+            """
+                # Comment
+                simple=1
+                nested.a = multiple \\
+                    lines
+                nested.b: unicode\\u2122
+            """
+        )
+    )
+
+    assert load_template(str(path)) == Template(
+        simple="1", nested=Template(a="multiple lines", b="unicode™")
+    )
+
+
+def test_load_properties_separators(tmp_path):
+    path = tmp_path / "template.properties"
+    path.write_text(
+        dedent(
+            """
+                spaced value
+                escaped\\=key=1
+                escaped\\:colon : 2
+                empty
+            """
+        )
+    )
+
+    assert load_template(str(path)) == Template(
+        spaced="value", **{"escaped=key": "1", "escaped:colon": "2", "empty": ""}
+    )
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["a=1\na.b=2\n", "a.b=2\na=1\n", "a.b=2\na.b.c=3\n"],
+)
+def test_conflicting_properties(tmp_path, content):
+    path = tmp_path / "template.properties"
+    path.write_text(content)
+
+    with pytest.raises(ValueError, match="'a"):
+        load_template(str(path))
+
+
+def test_unknown_format(tmp_path):
+    path = tmp_path / "template.ini"
+    path.write_text("")
+
+    with pytest.raises(ValueError):
+        load_template(str(path))
+
+
+def test_parsed_cache(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    path = tmp_path / "template.json"
+    path.write_text(json.dumps({"a": 1}))
+    parser = Mock(side_effect=loaders.PARSERS[".json"])
+    monkeypatch.setitem(loaders.PARSERS, ".json", parser)
+
+    assert load_template(str(path), cache_dir=cache_dir) == Template(a=1)
+    assert load_template(str(path), cache_dir=cache_dir) == Template(a=1)
+    assert parser.call_count == 1
+
+    path.write_text(json.dumps({"a": 22}))
+    os.utime(path, ns=(0, 0))
+
+    assert load_template(str(path), cache_dir=cache_dir) == Template(a=22)
+    assert parser.call_count == 2
+
+
+def test_unexpected_cache_is_a_miss(tmp_path):
+    cache_dir = tmp_path / "cache"
+    path = tmp_path / "template.json"
+    path.write_text(json.dumps({"a": 1}))
+    load_template(str(path), cache_dir=str(cache_dir))
+    for cache_file in cache_dir.iterdir():
+        cache_file.write_bytes(b"\x80\x04N.")
+
+    assert load_template(str(path), cache_dir=str(cache_dir)) == Template(a=1)
+    assert [path.suffix for path in cache_dir.iterdir()] == [".pickle"]
+
+
+def test_parser_changes_invalidate_the_cache(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    path = tmp_path / "template.json"
+    path.write_text(json.dumps({"a": 1}))
+    load_template(str(path), cache_dir=cache_dir)
+    parser = Mock(return_value={"a": 2})
+    monkeypatch.setitem(loaders.PARSERS, ".json", parser)
+    monkeypatch.setattr(loaders, "CACHE_VERSION", loaders.CACHE_VERSION + 1)
+
+    assert load_template(str(path), cache_dir=cache_dir) == Template(a=2)
@@ -0,0 +1,200 @@
+import pytest
+from mock import Mock
+
+from configurator.compiler import Config, ConfigSet, Template
+from configurator.memoize import fingerprint, pure_modifier, pure_validator
+from tests.common import TestException, TestNestedSchema, TestSimpleSchema
+
+
+def make_configset(values, modifiers=None, validators=None):
+    return ConfigSet(
+        configs=[
+            Config(
+                schema=TestNestedSchema,
+                writer=Mock(),
+                templates=[Template(simple=index, nested=Template(a=value, b=[]))],
+                config_modifiers=modifiers,
+                config_validators=validators,
+            )
+            for index, value in enumerate(values)
+        ]
+    )
+
+
+@pytest.mark.parametrize(
+    ["left", "right", "equal"],
+    [
+        (TestSimpleSchema(a=1, b=2), TestSimpleSchema(a=1, b=2), True),
+        (TestSimpleSchema(a=1, b=2), TestSimpleSchema(a=1, b=3), False),
+        (TestSimpleSchema(a=1, b=2), TestSimpleSchema(a=1, b=2.0), False),
+        ({"a": 1, "b": {2, 3}}, {"b": {3, 2}, "a": 1}, True),
+        ([1, 2], (1, 2), False),
+    ],
+)
+def test_fingerprint(left, right, equal):
+    assert (fingerprint(left) == fingerprint(right)) == equal
+
+
+def test_pure_validator_runs_once_per_subtree():
+    check = Mock()
+    validator = pure_validator("nested")(check)
+    configset = make_configset([1, 1, 2, 1], validators=[validator])
+
+    configset.materialize()
+
+    assert [call[0][0].a for call in check.call_args_list] == [1, 2]
+
+
+def test_pure_validator_caches_failures():
+    check = Mock(side_effect=TestException)
+    validator = pure_validator("nested")(check)
+
+    for _ in range(2):
+        with pytest.raises(TestException):
+            validator(TestNestedSchema(simple=1, nested=TestSimpleSchema(a=1, b=2)))
+
+    assert check.call_count == 1
+
+
+def test_pure_modifier_replays_changes():
+    calls = []
+
+    @pure_modifier("nested")
+    def double(nested):
+        calls.append(nested.a)
+        nested.a *= 2
+        nested.b.append("doubled")
+
+    configset = make_configset([1, 1, 2], modifiers=[double])
+    configset.materialize()
+
+    assert calls == [1, 2]
+    assert [config.output.nested for config in configset.configs] == [
+        TestSimpleSchema(a=2, b=["doubled"]),
+        TestSimpleSchema(a=2, b=["doubled"]),
+        TestSimpleSchema(a=4, b=["doubled"]),
+    ]
+    # Replayed values are not shared between configs.
+    first, second, _ = [config.output for config in configset.configs]
+    assert first.nested.b is not second.nested.b
+
+
+def test_replayed_changes_are_not_altered_by_later_modifiers():
+    @pure_modifier("nested")
+    def add_pure(nested):
+        nested.b.append("pure")
+
+    def tag(config):
+        config.nested.b.append(config.simple)
+
+    configset = make_configset([1, 1, 1], modifiers=[add_pure, tag])
+    configset.materialize()
+
+    assert [config.output.nested.b for config in configset.configs] == [
+        ["pure", 0],
+        ["pure", 1],
+        ["pure", 2],
+    ]
+
+
+def test_persistent_cache(tmp_path):
+    cache_path = str(tmp_path / "cache.pickle")
+    check = Mock()
+
+    def validator(nested):
+        check(nested)
+
+    config = TestNestedSchema(simple=1, nested=TestSimpleSchema(a=1, b=2))
+    first_run = pure_validator("nested", cache_path=cache_path)(validator)
+    first_run(config)
+    first_run.save()
+    second_run = pure_validator("nested", cache_path=cache_path)(validator)
+    second_run(config)
+
+    assert check.call_count == 1
+
+
+def make_limit_validator(limit, cache_path, version=None):
+    def validator(nested):
+        if nested.a > limit:
+            raise TestException()
+
+    return pure_validator("nested", cache_path=cache_path, version=version)(validator)
+
+
+def test_persistent_cache_depends_on_closure(tmp_path):
+    cache_path = str(tmp_path / "cache.pickle")
+    config = TestNestedSchema(simple=1, nested=TestSimpleSchema(a=3, b=2))
+    first_run = make_limit_validator(10, cache_path)
+    first_run(config)
+    first_run.save()
+
+    second_run = make_limit_validator(1, cache_path)
+
+    assert second_run.cache == {}
+    with pytest.raises(TestException):
+        second_run(config)
+
+
+def test_persistent_cache_depends_on_version(tmp_path):
+    cache_path = str(tmp_path / "cache.pickle")
+    config = TestNestedSchema(simple=1, nested=TestSimpleSchema(a=3, b=2))
+    first_run = make_limit_validator(10, cache_path, version="1")
+    first_run(config)
+    first_run.save()
+
+    assert make_limit_validator(10, cache_path, version="1").cache != {}
+    assert make_limit_validator(10, cache_path, version="2").cache == {}
+
+
+def test_hooks_sharing_a_cache_path(tmp_path):
+    cache_path = str(tmp_path / "cache.pickle")
+    config = TestNestedSchema(simple=1, nested=TestSimpleSchema(a=1, b=2))
+
+    def first(nested):
+        pass
+
+    def second(nested):
+        pass
+
+    for func in (first, second):
+        hook = pure_validator("nested", cache_path=cache_path)(func)
+        hook(config)
+        hook.save()
+
+    assert pure_validator("nested", cache_path=cache_path)(first).cache != {}
+    assert pure_validator("nested", cache_path=cache_path)(second).cache != {}
+
+
+class TestUnpicklableException(Exception):
+    def __init__(self, first, second):
+        super().__init__(first)
+
+
+def test_unreadable_cache_is_a_miss(tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    cache_path.write_bytes(b"\x80\x04truncated")
+    check = Mock()
+
+    validator = pure_validator("nested", cache_path=str(cache_path))(check)
+    validator(TestNestedSchema(simple=1, nested=TestSimpleSchema(a=1, b=2)))
+
+    assert check.call_count == 1
+
+
+def test_cached_exception_that_can_not_be_loaded_is_a_miss(tmp_path):
+    cache_path = str(tmp_path / "cache.pickle")
+
+    def validator(nested):
+        raise TestUnpicklableException(1, 2)
+
+    config = TestNestedSchema(simple=1, nested=TestSimpleSchema(a=1, b=2))
+    first_run = pure_validator("nested", cache_path=cache_path)(validator)
+    with pytest.raises(TestUnpicklableException):
+        first_run(config)
+    first_run.save()
+
+    second_run = pure_validator("nested", cache_path=cache_path)(validator)
+
+    assert second_run.cache == {}
+    assert [path.name for path in tmp_path.iterdir()] == ["cache.pickle"]
@@ -0,0 +1,62 @@
+import pytest
+from mock import Mock
+
+from configurator.compiler import Config, ConfigSet, Template
+from configurator.memory import MemoryBudgetExceeded, MemoryTracker
+from tests.common import TestSimpleSchema
+
+
+def make_configs(writer, count=5):
+    return [
+        Config(
+            schema=TestSimpleSchema,
+            writer=writer,
+            templates=[Template(a="x" * (index + 1) * 1000, b=2)],
+            name=f"config-{index}",
+        )
+        for index in range(count)
+    ]
+
+
+def test_report_per_phase():
+    tracker = MemoryTracker(top=2)
+
+    ConfigSet(configs=make_configs(Mock())).materialize(memory=tracker)
+
+    assert [phase.name for phase in tracker.report.phases] == [
+        "resolve",
+        "configset_modifiers",
+        "validate",
+        "configset_validators",
+        "write",
+    ]
+    resolve = tracker.report.phases[0]
+    assert resolve.retained > 0
+    assert resolve.peak >= resolve.retained
+    assert [identity for _, identity in tracker.report.largest_configs] == [
+        "config-4",
+        "config-3",
+    ]
+
+
+def test_budget_fails_with_report():
+    writer = Mock()
+    tracker = MemoryTracker(budget=0)
+    configset = ConfigSet(configs=make_configs(writer), configset_validators=[Mock()])
+
+    with pytest.raises(MemoryBudgetExceeded) as error:
+        configset.materialize(memory=tracker)
+
+    assert error.value.report is tracker.report
+    assert not writer.called
+
+
+def test_budget_switches_to_streaming():
+    writer = Mock()
+    configs = make_configs(writer)
+    tracker = MemoryTracker(budget=0, stream_on_budget=True)
+
+    ConfigSet(configs=configs).materialize(memory=tracker)
+
+    assert writer.call_count == 5
+    assert all(not hasattr(config, "output") for config in configs)
@@ -0,0 +1,98 @@
+import pytest
+
+from configurator.compiler import (
+    Config,
+    FlatTemplate,
+    Template,
+    instanciate_schema_from_template,
+)
+from configurator.operators import (
+    Append,
+    DeepMerge,
+    Extend,
+    Remove,
+    SetUnion,
+    Update,
+)
+from tests.common import TestSimpleSchema
+
+
+@pytest.mark.parametrize(
+    ["base", "operators", "expected"],
+    [
+        ({"x": 1, "y": 2}, [Update({"y": 3, "z": 4})], {"x": 1, "y": 3, "z": 4}),
+        (
+            {"x": {"y": 1, "z": 2}},
+            [DeepMerge({"x": {"z": 3}}), DeepMerge({"x": {"w": {"v": 4}}})],
+            {"x": {"y": 1, "z": 3, "w": {"v": 4}}},
+        ),
+        ({"x": 1, "y": 2}, [Remove("x", "missing")], {"y": 2}),
+        ([1], [Append(2), Extend([3, 4])], [1, 2, 3, 4]),
+        ({1}, [SetUnion({2}), SetUnion([1, 3])], {1, 2, 3}),
+    ],
+)
+def test_operators(base, operators, expected):
+    templates = [Template(a=base, b=0)] + [Template(a=op) for op in operators]
+    config = Config(TestSimpleSchema, writer=None, templates=templates)
+
+    config.resolve()
+
+    assert config.output == TestSimpleSchema(a=expected, b=0)
+
+
+def test_operators_do_not_alter_templates():
+    nested = {"y": 1}
+    base = Template(a={"x": nested}, b=[])
+    overlay = Template(a=DeepMerge({"x": {"z": 2}}), b=Append(1))
+
+    for template_class in (Template, FlatTemplate):
+        flat = template_class()
+        flat.merge_from(base)
+        flat.merge_from(overlay)
+        assert instanciate_schema_from_template(TestSimpleSchema, flat) == (
+            TestSimpleSchema(a={"x": {"y": 1, "z": 2}}, b=[1])
+        )
+
+    assert base == Template(a={"x": {"y": 1}}, b=[])
+    assert nested == {"y": 1}
+
+
+def test_operator_onto_missing_field():
+    template = Template(b=0)
+
+    template.merge_from(Template(a=Append(1)))
+    template.merge_from(Template(a=Append(2)))
+
+    assert instanciate_schema_from_template(TestSimpleSchema, template) == (
+        TestSimpleSchema(a=[1, 2], b=0)
+    )
+
+
+def test_template_merge_is_eager():
+    template = Template(a={"x": 1})
+
+    template.merge_from(Template(a=Update({"y": 2})))
+
+    assert template.a == {"x": 1, "y": 2}
+    assert template == Template(a={"x": 1, "y": 2})
+
+
+def test_flat_template_back_to_template_is_resolved():
+    flat = FlatTemplate.from_template(Template(a={"x": 1}))
+
+    flat.merge_from(Template(a=Update({"y": 2})))
+
+    assert flat.to_template() == Template(a={"x": 1, "y": 2})
+
+
+def test_callable_after_operators():
+    template = Template(a=[1], b=0)
+
+    template.merge_from(Template(a=Append(2)))
+    template.merge_from(Template(a=lambda value: value + [3]))
+
+    assert template.a == [1, 2, 3]
+
+
+def test_operators_are_callables():
+    assert DeepMerge({"x": {"z": 2}})({"x": {"y": 1}}) == {"x": {"y": 1, "z": 2}}
@@ -0,0 +1,131 @@
+import copy
+import json
+from functools import partial
+
+import pytest
+from mock import Mock, call
+
+from configurator.compiler import Config, ConfigSet, Template
+from configurator.patch import (
+    PatchManifest,
+    apply_patch,
+    diff,
+    hash_tree,
+    patch_writer,
+)
+from configurator.writers import patch_file_writer
+from tests.common import TestSimpleSchema
+
+
+@pytest.mark.parametrize(
+    ["old", "new", "expected"],
+    [
+        ({"a": 1, "b": {"c": 2}}, {"a": 1, "b": {"c": 2}}, []),
+        ({"a": 1, "b": {"c": 2}}, {"a": 1, "b": {"c": 3}}, [("replace", "/b/c")]),
+        ({"a": 1}, {"a": 1, "b/c": 2}, [("add", "/b~1c")]),
+        ({"a": 1, "b": 2}, {"a": 1}, [("remove", "/b")]),
+        ({"a": [1, {"b": 2}]}, {"a": [1, {"b": 3}]}, [("replace", "/a/1/b")]),
+        ({"a": [1, 2]}, {"a": [1, 2, 3]}, [("replace", "/a")]),
+        ({"a": 1}, "a=1", [("replace", "")]),
+    ],
+)
+def test_diff(old, new, expected):
+    patch = diff(old, hash_tree(old), new, hash_tree(new))
+
+    assert [(operation["op"], operation["path"]) for operation in patch] == expected
+    assert apply_patch(copy.deepcopy(old), patch) == new
+
+
+def test_equal_subtrees_are_pruned():
+    old, new = {"a": {"b": 1}, "c": 1}, {"a": {"b": 1}, "c": 2}
+    old_tree = hash_tree(old)
+    # Equal hashes are trusted, the data itself is not looked at.
+    del old["a"]["b"]
+
+    assert diff(old, old_tree, new, hash_tree(new)) == [
+        {"op": "replace", "path": "/c", "value": 2}
+    ]
+
+
+def make_configset(patches_writer, full_writer, value):
+    return ConfigSet(
+        configs=[
+            Config(
+                schema=TestSimpleSchema,
+                writer=patches_writer,
+                templates=[Template(a={"x": value, "y": 1}, b=2)],
+                name="patched",
+            ),
+            Config(
+                schema=TestSimpleSchema,
+                writer=full_writer,
+                templates=[Template(a=value, b=2)],
+                name="full",
+            ),
+        ]
+    )
+
+
+def test_materialize_patches(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    patches_writer = patch_writer(Mock())
+    full_writer = Mock()
+
+    for value in (1, 1, 2):
+        manifest = PatchManifest.load(manifest_path)
+        make_configset(patches_writer, full_writer, value).materialize(patches=manifest)
+        manifest.dump(manifest_path)
+
+    assert patches_writer.call_args_list == [
+        call([{"op": "add", "path": "", "value": {"a": {"x": 1, "y": 1}, "b": 2}}]),
+        call([{"op": "replace", "path": "/a/x", "value": 2}]),
+    ]
+    assert full_writer.call_count == 3
+
+
+def test_prune_configs_no_longer_built(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    manifest = PatchManifest.load(manifest_path)
+    make_configset(patch_writer(Mock()), Mock(), 1).materialize(patches=manifest)
+    manifest.dump(manifest_path)
+
+    manifest = PatchManifest.load(manifest_path)
+    ConfigSet(
+        configs=[
+            Config(
+                schema=TestSimpleSchema,
+                writer=Mock(),
+                templates=[Template(a=1, b=2)],
+                name="full",
+            )
+        ]
+    ).materialize(patches=manifest)
+    removed = manifest.prune()
+
+    assert list(removed) == ["patched"]
+    assert apply_patch({"a": 1}, removed["patched"]) is None
+    assert list(manifest.entries) == ["full"]
+    assert manifest.prune() == {}
+
+
+def test_patch_file_writer(tmp_path):
+    path = tmp_path / "patches" / "config.json"
+    manifest = PatchManifest.from_files({"patched": str(tmp_path / "missing.json")})
+    writer = partial(patch_file_writer, path=str(path))
+
+    make_configset(writer, Mock(), 1).materialize(patches=manifest)
+
+    assert json.loads(path.read_text()) == [
+        {"op": "add", "path": "", "value": {"a": {"x": 1, "y": 1}, "b": 2}}
+    ]
+
+
+def test_manifest_from_existing_files(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"a": {"x": 1, "y": 1}, "b": 2}))
+    manifest = PatchManifest.from_files({"patched": str(path)})
+    patches_writer = patch_writer(Mock())
+
+    make_configset(patches_writer, Mock(), 1).materialize(patches=manifest)
+
+    assert not patches_writer.called
@@ -1,10 +1,15 @@
+import json
 from dataclasses import dataclass
 from textwrap import dedent
 from typing import Any
 
 import pytest
 
-from configurator.compiler import Template, instanciate_schema_from_template
+from configurator.compiler import (
+    FlatTemplate,
+    Template,
+    instanciate_schema_from_template,
+)
 from configurator.schemas import DictSchema, JsonSchema, PropertiesSchema
 from tests.common import TestNestedSchema, TestSimpleSchema
 
@@ -32,11 +37,21 @@ def test_valid_instanciation(schema, template, expected):
     assert result == expected
 
 
+def test_valid_instanciation_from_flat_template():
+    template = FlatTemplate({"simple": 1, "nested.a": 1, "nested.b": 2})
+
+    result = instanciate_schema_from_template(TestNestedSchema, template)
+
+    assert result == TestNestedSchema(simple=1, nested=TestSimpleSchema(a=1, b=2))
+
+
 @pytest.mark.parametrize(
     ["schema", "template", "error"],
     [
         (TestSimpleSchema, Template(a=1), TypeError),
         (TestSimpleSchema, Template(a=1, b=2, c=3), TypeError),
+        (TestSimpleSchema, FlatTemplate({"a": 1}), TypeError),
+        (TestNestedSchema, FlatTemplate({"simple": 1, "nested.a": 1}), TypeError),
     ],
 )
 def test_invalid_instanciation(schema, template, error):
@@ -217,3 +232,40 @@ test_cases = [
 )
 def test_serialization(config, expected):
     assert config.serialize() == expected
+
+
+@pytest.mark.parametrize(
+    ["config"],
+    [
+        (TestJsonSchema(a=[], b={}),),
+        (TestJsonSchema(a=(1, [2.5, None]), b={"z": [], "y": {"x": True}}),),
+        (TestJsonSchema(a="unicode™\n\"quoted\"", b=[float("nan"), float("inf")]),),
+        (TestJsonSchema(a=[TestSimpleSchema(1, [])], b={"c": TestJsonSchema(1, 2)}),),
+        (TestJsonSchema(a=TestPropertiesSchema(a=1, b=2), b={"c": 1, "a": 2}),),
+        (
+            TestJsonSchema(
+                a=TestNestedSchema(1, TestSimpleSchema({"b": 1, "a": 2}, 3)), b=1
+            ),
+        ),
+    ],
+)
+def test_json_direct_encoding_matches_json_dumps(config):
+    expected = json.dumps(DictSchema.serialize(config), sort_keys=True, indent=4)
+
+    assert config.serialize() == expected
+
+
+@pytest.mark.parametrize(
+    ["config"],
+    [
+        # Sets are not json serializable.
+        (TestJsonSchema(a={1, 2}, b=1),),
+        # Schemas are only serialized in the top level containers.
+        (TestJsonSchema(a=[[TestSimpleSchema(1, 2)]], b=1),),
+    ],
+)
+def test_json_direct_encoding_fallback(config):
+    with pytest.raises(TypeError):
+        json.dumps(DictSchema.serialize(config), sort_keys=True, indent=4)
+    with pytest.raises(TypeError):
+        config.serialize()
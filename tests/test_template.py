@@ -1,6 +1,6 @@
 import pytest
 
-from configurator.compiler import Template
+from configurator.compiler import NESTED, FlatTemplate, Template
 
 
 @pytest.mark.parametrize(
@@ -34,3 +34,55 @@ def test_template_merge(source, other, expected):
     result.merge_from(Template(**other))
 
     assert result == Template(**expected)
+
+
+merge_cases = [
+    ({"a": 1}, {"a": 2}),
+    ({"a": 1}, {"b": 2}),
+    ({"a": 1}, {"a": lambda x: x + 10}),
+    ({"a": Template(b=1)}, {"a": Template(c=2)}),
+    ({"a": 1}, {"a": Template(c=2)}),
+    ({"a": Template(c=2)}, {"a": 1}),
+    ({"a": Template(b=Template(c=1), d=2)}, {"a": Template(b=Template(e=3))}),
+    ({"a": Template(b=1)}, {"a": lambda t: Template(c=t.b + 1)}),
+    ({"a": Template(b=Template(c=1))}, {"a": Template(b=Template())}),
+]
+
+
+@pytest.mark.parametrize(["source", "other"], merge_cases)
+def test_flat_template_merge_matches_template(source, other):
+    expected = Template(**source)
+    expected.merge_from(Template(**other))
+    result = FlatTemplate.from_template(Template(**source))
+
+    result.merge_from(Template(**other))
+
+    assert result.to_template() == expected
+
+
+@pytest.mark.parametrize(["source", "other"], merge_cases)
+def test_flat_template_merge_flat(source, other):
+    result = FlatTemplate.from_template(Template(**source))
+
+    result.merge_from(FlatTemplate.from_template(Template(**other)))
+
+    expected = Template(**source)
+    expected.merge_from(Template(**other))
+    assert result.to_template() == expected
+
+
+def test_flat_template_dotted_paths():
+    flat = FlatTemplate({"a": 1, "b.c.d": 2})
+    flat.merge_from(FlatTemplate({"b.c.d": 3, "b.e": 4}))
+
+    assert flat.values == {"a": 1, "b": NESTED, "b.c": NESTED, "b.c.d": 3, "b.e": 4}
+    assert flat.to_template() == Template(a=1, b=Template(c=Template(d=3), e=4))
+
+
+def test_flat_template_does_not_alter_merged_templates():
+    nested = Template(b=1)
+    flat = FlatTemplate.from_template(Template(a=nested))
+
+    flat.merge_from(Template(a=Template(c=2)))
+
+    assert nested == Template(b=1)
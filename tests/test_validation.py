@@ -0,0 +1,65 @@
+import time
+
+import pytest
+from mock import Mock
+
+from configurator.compiler import Config, ConfigSet, Template
+from configurator.validation import ValidationError, validate_concurrently
+from tests.common import TestException, TestSimpleSchema
+
+
+def fail_if_even(config):
+    if config.a % 2 == 0:
+        raise TestException(f"{config.a} is even")
+
+
+def test_every_failure_is_reported():
+    writer = Mock()
+    configset = ConfigSet(
+        configs=[
+            Config(
+                schema=TestSimpleSchema,
+                writer=writer,
+                templates=[Template(a=index, b=2)],
+                config_validators=[fail_if_even, Mock()],
+                name=f"config-{index}",
+            )
+            for index in range(5)
+        ]
+    )
+
+    with pytest.raises(ValidationError) as error:
+        configset.materialize(validation_workers=4)
+
+    assert error.value.report.grouped() == {
+        f"config-{index}": {"fail_if_even": [f"TestException: {index} is even"]}
+        for index in (0, 2, 4)
+    }
+    assert not error.value.report.cancelled
+    assert not writer.called
+
+
+def test_fail_fast_cancels_outstanding_validators():
+    def slow(config):
+        # Give the failure enough time to cancel the validators queued after it.
+        time.sleep(0.2)
+
+    never_run = Mock()
+    configs = [("failing", None, [Mock(side_effect=TestException)])]
+    configs += [("slow", None, [slow])]
+    configs += [(f"other-{index}", None, [never_run]) for index in range(10)]
+
+    report = validate_concurrently(configs, max_workers=1, max_failures=1)
+
+    assert report.cancelled
+    assert [failure.config for failure in report.failures] == ["failing"]
+    assert not never_run.called
+
+
+def test_no_failures():
+    validator = Mock()
+
+    report = validate_concurrently([("a", None, [validator]), ("b", None, [validator])])
+
+    assert report.failures == []
+    assert validator.call_count == 2
@@ -0,0 +1,217 @@
+import importlib
+import json
+import os
+import sys
+from textwrap import dedent
+
+import pytest
+from mock import Mock
+
+from configurator.compiler import Config, ConfigSet, Template
+from configurator.watch import Watcher
+from tests.common import TestNestedSchema, TestSimpleSchema
+
+
+def write_module(path, value):
+    path.write_text(
+        dedent(
+            f"""
+                from configurator.compiler import Template
+
+                template = Template(a={value}, b=2)
+            """
+        )
+    )
+    # Make sure the change is noticed even on coarse mtime filesystems.
+    os.utime(path, ns=(value * 10 ** 9, value * 10 ** 9))
+
+
+@pytest.fixture
+def modules(tmp_path):
+    sys.path.insert(0, str(tmp_path))
+    write_module(tmp_path / "watched_used.py", 1)
+    write_module(tmp_path / "watched_unused.py", 1)
+    yield (
+        tmp_path,
+        importlib.import_module("watched_used"),
+        importlib.import_module("watched_unused"),
+    )
+    sys.path.remove(str(tmp_path))
+    del sys.modules["watched_used"]
+    del sys.modules["watched_unused"]
+
+
+def test_only_rebuild_dependent_configsets(modules):
+    tmp_path, used, unused = modules
+    writer = Mock()
+
+    def factory():
+        return ConfigSet(
+            configs=[
+                Config(
+                    schema=TestSimpleSchema,
+                    writer=writer,
+                    templates=[sys.modules["watched_used"].template],
+                )
+            ]
+        )
+
+    watcher = Watcher(modules=[used, unused], factories=[factory])
+    watcher.build(factory)
+    assert writer.call_count == 1
+
+    write_module(tmp_path / "watched_unused.py", 2)
+    assert watcher.step() == []
+    assert writer.call_count == 1
+
+    write_module(tmp_path / "watched_used.py", 3)
+    assert watcher.step() == [factory]
+    assert writer.call_count == 2
+    assert writer.call_args[0][0] == TestSimpleSchema(a=3, b=2)
+
+
+def test_nested_module_templates_are_dependencies(modules):
+    tmp_path, used, _ = modules
+    writer = Mock()
+
+    def factory():
+        return ConfigSet(
+            configs=[
+                Config(
+                    schema=TestNestedSchema,
+                    writer=writer,
+                    templates=[
+                        Template(simple=1, nested=sys.modules["watched_used"].template)
+                    ],
+                )
+            ]
+        )
+
+    watcher = Watcher(modules=[used], factories=[factory])
+    watcher.build(factory)
+
+    write_module(tmp_path / "watched_used.py", 3)
+
+    assert watcher.step() == [factory]
+    assert writer.call_args[0][0].nested == TestSimpleSchema(a=3, b=2)
+
+
+def test_importers_are_reloaded(modules):
+    tmp_path, used, _ = modules
+    output = tmp_path / "output.json"
+    (tmp_path / "watched_importer.py").write_text(
+        dedent(
+            f"""
+                import json
+
+                from configurator.compiler import Config, ConfigSet
+                from tests.common import TestSimpleSchema
+                from watched_used import template
+
+
+                def writer(config):
+                    with open({str(output)!r}, "w") as fd:
+                        json.dump({{"a": config.a}}, fd)
+
+
+                def factory():
+                    return ConfigSet(
+                        configs=[
+                            Config(
+                                schema=TestSimpleSchema,
+                                writer=writer,
+                                templates=[template],
+                            )
+                        ]
+                    )
+            """
+        )
+    )
+    factory = importlib.import_module("watched_importer").factory
+    try:
+        watcher = Watcher(modules=[used], factories=[factory])
+        watcher.build(factory)
+
+        write_module(tmp_path / "watched_used.py", 2)
+        assert watcher.step() == [factory]
+        assert json.loads(output.read_text())["a"] == 2
+
+        write_module(tmp_path / "watched_used.py", 3)
+        assert watcher.step() == [factory]
+        assert json.loads(output.read_text())["a"] == 3
+    finally:
+        del sys.modules["watched_importer"]
+
+
+def test_lost_dependencies_are_kept(modules, caplog):
+    tmp_path, used, _ = modules
+    writer = Mock()
+    template = used.template
+
+    def factory():
+        return ConfigSet(
+            configs=[
+                Config(schema=TestSimpleSchema, writer=writer, templates=[template])
+            ]
+        )
+
+    watcher = Watcher(modules=[used], factories=[factory])
+    watcher.build(factory)
+
+    write_module(tmp_path / "watched_used.py", 2)
+    assert watcher.step() == [factory]
+    assert "no longer uses the templates of ['watched_used']" in caplog.text
+
+    write_module(tmp_path / "watched_used.py", 3)
+    assert watcher.step() == [factory]
+
+
+def test_failed_rebuild_keeps_watching(modules):
+    tmp_path, used, _ = modules
+    writer = Mock(side_effect=Exception)
+
+    def factory():
+        return ConfigSet(
+            configs=[
+                Config(
+                    schema=TestSimpleSchema,
+                    writer=writer,
+                    templates=[sys.modules["watched_used"].template],
+                )
+            ]
+        )
+
+    watcher = Watcher(modules=[used], factories=[factory])
+    watcher.safe_build(factory)
+    assert writer.call_count == 1
+
+    write_module(tmp_path / "watched_used.py", 2)
+
+    assert watcher.step() == [factory]
+    assert writer.call_count == 2
+
+
+def test_failed_factory_is_retried_on_any_change(modules):
+    tmp_path, used, unused = modules
+    factory = Mock(side_effect=Exception)
+    watcher = Watcher(modules=[used, unused], factories=[factory])
+    watcher.safe_build(factory)
+
+    write_module(tmp_path / "watched_unused.py", 2)
+
+    assert watcher.step() == [factory]
+    assert factory.call_count == 2
+
+
+def test_missing_file_is_checked_next_time(modules):
+    tmp_path, used, _ = modules
+    watcher = Watcher(modules=[used], factories=[])
+    path = tmp_path / "watched_used.py"
+    moved = tmp_path / "watched_used.py.swp"
+
+    path.rename(moved)
+    assert watcher.changed_modules() == set()
+
+    moved.rename(path)
+    write_module(path, 2)
+    assert watcher.changed_modules() == {"watched_used"}